@@ -0,0 +1,125 @@
+"""
+Copyright© 2024 Artur Pozniak <noi.kucia@gmail.com> or <noiszewczyk@gmail.com>.
+All rights reserved.
+This program is released under license GPL-3.0-or-later
+
+This file is part of MathGraph.
+MathGraph is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+MathGraph is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with MathGraph.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import random
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formula import Formula, EvaluatingError, functions, operators_precedence, maximum_value  # noqa: E402
+
+# formulas used by bots, see bot.generate_function
+bot_formulas = ["3 cos (5x) / x", ' sin x', '5', 'x', 'abs(x)', '-x', 'exp(0.01x)', 'x%3', '(tan x) / 1000',
+                '2sin (x) - (2sin(x)%0.5)']
+points = [x / 20 for x in range(-380, 381) if x]  # one shot across the whole default field
+# formulas using every operator and function, to check that evaluate and evaluate_many agree
+checked_formulas = bot_formulas + ['x^0.5', 'x^2.5', '(x/10)^x', '2^x', '(-x)^3', 'x^(-2)', 'sqrt(x)', 'rt(x-1)',
+                                   'ln(x)', 'log(x)', 'lg(x^2)', 'tan(3x)', 'exp(x)', 'x%(-0.7)', '1/(x-2)',
+                                   'sin(x^3)', 'cos(x)^2', '10sin(100x)', 'abs(x)%1.5']
+
+
+def interpret(postfix_formula: list, argument: float):
+    """the token list interpreter Formula.evaluate used before formulas were compiled, kept as a reference"""
+    tokens = postfix_formula.copy()
+    while len(tokens) > 1:
+        i = 0
+        while 0 <= i < len(tokens):
+            token = tokens[i]
+            if type(token) == str:
+                if token == 'x':
+                    tokens[i] = argument
+                elif token in operators_precedence.keys():
+                    a, b = tokens[i - 2], tokens[i - 1]
+                    match token:
+                        case '+':
+                            value = a + b
+                        case '-':
+                            value = a - b
+                        case '*':
+                            value = a * b
+                        case '/':
+                            value = a / b
+                        case '^':
+                            value = a ** b
+                        case '%':
+                            value = a % b
+                    tokens.pop(i - 1)
+                    tokens.pop(i - 1)
+                    if value > maximum_value:
+                        value = maximum_value + 10 * random.random()
+                    if value < -maximum_value:
+                        value = -maximum_value + 10 * random.random()
+                    tokens[i - 2] = value
+                    i -= 2
+                else:
+                    if token == 'exp' and tokens[i - 1] > 100:
+                        tokens[i - 1] = 100 + 2 * random.random()
+                    tokens[i - 1] = functions[token](tokens[i - 1])
+                    tokens.pop(i)
+                    i -= 1
+            i += 1
+        else:
+            break
+    if tokens[-1] == 'x':
+        return argument
+    return float(min(max(tokens[-1], -maximum_value), maximum_value))
+
+
+def check_identity():
+    """compares evaluate with evaluate_many on long arrays, they must agree bit-for-bit"""
+    rng = np.random.default_rng(0)
+    array = np.concatenate([np.linspace(-40, 40, 20001), rng.uniform(-40, 40, 20000)])
+    for source in checked_formulas:
+        formula = Formula(source)
+        values, defined = formula.evaluate_many(array)
+        mismatches = 0
+        for x, value, is_defined in zip(array.tolist(), values.tolist(), defined.tolist()):
+            try:
+                mismatches += formula.evaluate(x) != value or not is_defined
+            except EvaluatingError:
+                mismatches += is_defined
+        assert not mismatches, f'{source}: {mismatches} of {len(array)} points differ'
+    print(f'evaluate and evaluate_many agree on {len(checked_formulas)} formulas, {len(array)} points each')
+
+
+def main():
+    check_identity()
+    print(f'{"formula":<28}{"interpreted, us":>18}{"compiled, us":>15}{"speedup":>10}{"vectorized, us":>17}'
+          f'{"speedup":>10}')
+    array = np.array(points)
+    for source in bot_formulas:
+        formula = Formula(source)
+        for x in points:
+            assert abs(interpret(formula.formula, x) - formula.evaluate(x)) < 1e-9, (source, x)
+
+        repeats = 20
+        interpreted = min(timeit.repeat(lambda: [interpret(formula.formula, x) for x in points],
+                                        number=1, repeat=repeats)) / len(points) * 1e6
+        compiled = min(timeit.repeat(lambda: [formula.evaluate(x) for x in points],
+                                     number=1, repeat=repeats)) / len(points) * 1e6
+        vectorized = min(timeit.repeat(lambda: formula.evaluate_many(array),
+                                       number=1, repeat=repeats)) / len(points) * 1e6
+        print(f'{source.strip():<28}{interpreted:>18.2f}{compiled:>15.2f}{interpreted / compiled:>9.1f}x'
+              f'{vectorized:>17.3f}{interpreted / vectorized:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
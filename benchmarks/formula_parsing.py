@@ -0,0 +1,49 @@
+"""
+Copyright© 2024 Artur Pozniak <noi.kucia@gmail.com> or <noiszewczyk@gmail.com>.
+All rights reserved.
+This program is released under license GPL-3.0-or-later
+
+This file is part of MathGraph.
+MathGraph is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+MathGraph is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with MathGraph.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formula import Formula  # noqa: E402
+
+
+def long_formula(chunks: int) -> str:
+    """12 tokens after translation per chunk, constants differ, so nothing is shared in the tree"""
+    return ''.join(f'sin({i % 97}.5x) * abs(x - {i}) / 7 + ' for i in range(chunks)) + 'x'
+
+
+def main():
+    print(f'{"tokens":>10}{"translation, ms":>18}{"us per token":>15}{"formula, ms":>14}{"us per token":>15}')
+    for chunks in (84, 834, 8334):
+        source = long_formula(chunks)
+        start = time.perf_counter()
+        tokens = len(Formula.translate_to_postfix(source))
+        translation = time.perf_counter() - start
+
+        start = time.perf_counter()
+        Formula(source)  # translation, tree building and compilation, source is never cached here
+        construction = time.perf_counter() - start
+
+        print(f'{tokens:>10}{translation * 1e3:>18.1f}{translation / tokens * 1e6:>15.2f}'
+              f'{construction * 1e3:>14.1f}{construction / tokens * 1e6:>15.2f}')
+
+
+if __name__ == '__main__':
+    main()
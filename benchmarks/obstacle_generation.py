@@ -0,0 +1,77 @@
+"""
+Copyright© 2024 Artur Pozniak <noi.kucia@gmail.com> or <noiszewczyk@gmail.com>.
+All rights reserved.
+This program is released under license GPL-3.0-or-later
+
+This file is part of MathGraph.
+MathGraph is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+MathGraph is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with MathGraph.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import obstacles  # noqa: E402
+from obstacles import generate_obstacles, random_obstacle  # noqa: E402
+
+counts = (20, 100, 500, 2000)
+default_count = 16  # obstacles on the default field with 20% obstacle frequency
+x2y = 2.383
+
+
+def pairwise_obstacles(count: int, x_edge: float, y_edge: float, field_ratio: float, rng: np.random.Generator) -> list:
+    """the same generation, but every candidate is checked against every placed obstacle like it was before"""
+    placed = []
+    failures = 0
+    while len(placed) < count and failures < obstacles.obstacle_failures:
+        shrink = 1
+        for _ in range(obstacles.obstacle_attempts):
+            polygon = random_obstacle(x_edge, y_edge, field_ratio, shrink, rng)
+            if not any(polygon.intersects(obstacle) for obstacle in placed):
+                placed.append(polygon)
+                failures = 0
+                break
+            shrink *= obstacles.obstacle_shrink
+        else:
+            failures += 1
+    return placed
+
+
+def timed(generate, *args) -> tuple:
+    start = time.perf_counter()
+    placed = generate(*args, rng=np.random.default_rng(2024))
+    return len(placed), (time.perf_counter() - start) * 1e3
+
+
+def main():
+    print('field grows with obstacle count, density is the same as on the default field')
+    print(f'{"count":>7}{"y edge":>9}{"placed":>9}{"index, ms":>12}{"pairwise, ms":>15}')
+    for count in counts:
+        y_edge = 16 * math.sqrt(count / default_count)
+        args = (count, y_edge * x2y, y_edge, 1)
+        placed, index_time = timed(generate_obstacles, *args)
+        pairwise_time = timed(pairwise_obstacles, *args)[1]
+        print(f'{count:>7}{y_edge:>9.1f}{placed:>9}{index_time:>12.1f}{pairwise_time:>15.1f}')
+
+    print('\ndefault field, too many obstacles are replaced by smaller ones or skipped')
+    print(f'{"count":>7}{"placed":>9}{"index, ms":>12}')
+    for count in counts:
+        placed, index_time = timed(generate_obstacles, count, 16 * x2y, 16, 1)
+        print(f'{count:>7}{placed:>9}{index_time:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
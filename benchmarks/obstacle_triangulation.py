@@ -0,0 +1,87 @@
+"""
+Copyright© 2024 Artur Pozniak <noi.kucia@gmail.com> or <noiszewczyk@gmail.com>.
+All rights reserved.
+This program is released under license GPL-3.0-or-later
+
+This file is part of MathGraph.
+MathGraph is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+MathGraph is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with MathGraph.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import shapely
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from obstacles import generate_obstacles, triangulate  # noqa: E402
+
+try:
+    import tripy  # the old pure python ear clipping, isn't a dependency anymore
+except ImportError:
+    tripy = None
+
+hits = (0, 20, 40, 80)  # blows on the map, late match fragments are made by lots of them
+blow_radius = 1.35  # the same as in GameView.obstacle_hit for the default field
+hole_frequency = 0.3  # part of blows inside the obstacle, which make holes if they fit, other ones are on its border
+
+
+def blow(point: np.ndarray, rng: np.random.Generator) -> shapely.Polygon:
+    """clipping polygon like in GameView.obstacle_hit"""
+    angles = np.cumsum(rng.integers(85, 100, 8, endpoint=True))
+    angles = 2 * math.pi * angles / angles[-1]
+    return shapely.Polygon(np.column_stack((point[0] + blow_radius * np.cos(angles),
+                                            point[1] + blow_radius * np.sin(angles))))
+
+
+def damaged_fragments(count: int, rng: np.random.Generator) -> list:
+    """hits obstacles of the default field count times and returns polygons of all fragments,
+    bigger fragments are hit more often"""
+    fragments = generate_obstacles(20, 16 * 2.383, 16, 1, rng=rng)
+    for _ in range(count):
+        areas = shapely.area(fragments)
+        fragment = fragments.pop(rng.choice(len(fragments), p=areas / areas.sum()))
+        point = shapely.get_coordinates(fragment.exterior.interpolate(rng.random(), normalized=True))[0]
+        if rng.random() < hole_frequency:
+            inside = shapely.get_coordinates(fragment.point_on_surface())[0]
+            if fragment.contains(blow(inside, rng)):
+                point = inside
+        damaged = shapely.get_parts(fragment.difference(blow(point, rng)))
+        fragments.extend(damaged[shapely.area(damaged) > 1e-9])
+    return fragments
+
+
+def timed(function, fragments: list) -> float:
+    start = time.perf_counter()
+    for fragment in fragments:
+        function(fragment)
+    return (time.perf_counter() - start) * 1e3
+
+
+def main():
+    print(f'{"hits":>5}{"fragments":>11}{"vertices":>10}{"max":>6}{"holes":>7}'
+          f'{"triangulate, ms":>17}{"tripy, ms":>11}')
+    for count in hits:
+        fragments = damaged_fragments(count, np.random.default_rng(2024))
+        vertices = [len(fragment.exterior.coords) + sum(len(ring.coords) for ring in fragment.interiors)
+                    for fragment in fragments]
+        holes = sum(len(fragment.interiors) for fragment in fragments)
+        tripy_time = f'{timed(lambda fragment: tripy.earclip(fragment.exterior.coords[:-1]), fragments):>11.1f}' \
+            if tripy else f'{"-":>11}'  # tripy can't triangulate holes, so it gets only the outer rings
+        print(f'{count:>5}{len(fragments):>11}{sum(vertices):>10}{max(vertices):>6}{holes:>7}'
+              f'{timed(triangulate, fragments):>17.1f}{tripy_time}')
+
+
+if __name__ == '__main__':
+    main()
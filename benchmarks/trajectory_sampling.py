@@ -0,0 +1,45 @@
+"""
+Copyright© 2024 Artur Pozniak <noi.kucia@gmail.com> or <noiszewczyk@gmail.com>.
+All rights reserved.
+This program is released under license GPL-3.0-or-later
+
+This file is part of MathGraph.
+MathGraph is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+MathGraph is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with MathGraph.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formula import Formula  # noqa: E402
+from trajectory import sample_range  # noqa: E402
+
+# formulas used by bots, see bot.generate_function
+bot_formulas = ["3 cos (5x) / x", ' sin x', '5', 'x', 'abs(x)', '-x', 'exp(0.01x)', 'x%3', '(tan x) / 1000',
+                '2sin (x) - (2sin(x)%0.5)']
+x_edge, y_edge = 16 * 2.383, 16  # default game field
+fixed_step = 0.5 / (770 / 2 / y_edge)  # 0.5 px on 1080p screen, the step used before adaptive sampling
+
+
+def main():
+    x_from, x_to = -x_edge + 2, x_edge  # shot from the left side of the field
+    fixed_points = int((x_to - x_from) / fixed_step) + 1
+    tolerances = (0.005, 0.02, 0.05)
+    print(f'{"formula":<28}{"fixed step":>12}' + ''.join(f'{f"tolerance {tolerance}":>17}' for tolerance in tolerances))
+    for source in bot_formulas:
+        formula = Formula(source)
+        counts = [len(sample_range(formula, x_from, x_to, tolerance, (-y_edge, y_edge))[0]) for tolerance in tolerances]
+        print(f'{source.strip():<28}{fixed_points:>12}' + ''.join(f'{count:>17}' for count in counts))
+
+
+if __name__ == '__main__':
+    main()
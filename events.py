@@ -145,9 +145,9 @@ class GameEventManager(EventManager):
 
                 case "StartFire":
                     game.formula = event.get_formula()
+                    view.start_shot(game.formula)  # the shot is resolved in a worker thread and shown meanwhile
                     game.shooting = True
                     game.formula_current_x = game.active_player.x
-                    view.translation_y_delta = game.active_player.y - game.formula.evaluate(game.active_player.x)
                     game.formula_segments = shape_list.ShapeElementList()
 
                 case "TimerReset":
@@ -16,19 +16,28 @@ If not, see <https://www.gnu.org/licenses/>.
 """
 
 import math
-import random
 import re
+import sys
+from functools import lru_cache
+
+import numpy as np
 
 operators_precedence = {'-': 1, '+': 1, '*': 4, '/': 4, '%': 4, '^': 5, '(': 10, ')': 10}
 constants = {'pi': 3.141592_653589_793238, 'e': 2.718281828459045}
 functions = {'abs': abs, 'sqrt': math.sqrt, 'rt': math.sqrt, 'exp': math.exp, 'tan': math.tan, 'tg': math.tan,
              'sin': math.sin, 'cos': math.cos, 'log': math.log10, 'lg': math.log10, 'ln': lambda x: math.log(math.e, x)}
+# numpy versions of functions, used to evaluate formula for many arguments at once
+vectorized_functions = {'abs': np.abs, 'sqrt': np.sqrt, 'rt': np.sqrt, 'exp': np.exp, 'tan': np.tan, 'tg': np.tan,
+                        'sin': np.sin, 'cos': np.cos, 'log': np.log10, 'lg': np.log10,
+                        'ln': lambda x: 1 / np.log(np.where(x > 0, x, np.nan))}
 functions_precedence = 2
 maximum_value = 50000
 
 
 class TranslateError(Exception):
-    pass
+    def __init__(self, column: int = None):
+        super().__init__()
+        self.column = column  # index of the symbol in infix formula, where the error was found, if known
 
 
 class NumberError(TranslateError):
@@ -43,7 +52,7 @@ class TokenError(TranslateError):
     pass
 
 
-class EvaluatingError:
+class EvaluatingError(Exception):
     pass
 
 
@@ -55,203 +64,747 @@ class ArgumentOutOfRange(EvaluatingError):
     pass
 
 
+# every token with whitespaces before it, line feeds are ignored even inside numbers and names
+token_pattern = re.compile(r'[ \t\a\r\v\n]*(?:'
+                           r'(?P<number>\d(?:\n*[\d.])*)'
+                           r'|(?P<identifier>[^\W\d_](?:\n*[^\W\d_])*)'
+                           r'|(?P<operator>[-+*/%^:])'
+                           r'|(?P<paren>[()])'
+                           r'|(?P<unknown>[^ \t\a\r\v\n]))')
+
+
+class Token:
+    """Token of infix formula.
+
+    kind is 'number', 'identifier', 'operator' or 'paren', value is a number for numbers and a string otherwise,
+    column is the index of the first symbol of the token in the formula"""
+
+    __slots__ = ('kind', 'value', 'column')
+
+    def __init__(self, kind: str, value, column: int):
+        self.kind = kind
+        self.value = value
+        self.column = column
+
+
+def tokenize(infix_formula: str) -> list:
+    """Splits infix formula into tokens in one pass.
+
+    Adds implicit tokens the user may skip: 0 before unary '-' (first in formula or right after '('),
+    '*' after a number or ')' followed by a name or '('. ':' becomes '/'"""
+
+    tokens = []
+    previous = None
+    for match in token_pattern.finditer(infix_formula):
+        kind = match.lastgroup
+        text = match.group(kind)
+        column = match.start(kind)
+        if kind == 'number':
+            try:
+                value = float(text.replace('\n', '')) if '.' in text else int(text.replace('\n', ''))
+            except ValueError:
+                raise NumberError(column)  # if number is wrong (more than 1 point for example)
+            if value > sys.float_info.max:
+                value = maximum_value  # too big even for float, clamped like evaluators clamp results
+        elif kind == 'identifier':
+            value = text.replace('\n', '').lower()
+        elif kind == 'unknown':
+            raise TokenError(column)
+        else:
+            value = '/' if text == ':' else text
+
+        if value == '-' and (previous is None or previous.value == '('):
+            tokens.append(Token('number', 0, column))  # unary '-'
+        elif (kind == 'identifier' or value == '(') and previous and \
+                (previous.kind == 'number' or previous.value == ')'):
+            tokens.append(Token('operator', '*', column))
+        previous = Token(kind, value, column)
+        tokens.append(previous)
+    return tokens
+
+
+def normalize(infix_formula: str) -> str:
+    """Returns the formula in the form, which is translated exactly like the original one:
+    lowercase, without line feeds and with every sequence of whitespaces replaced by a single space"""
+    return re.sub(r'[ \t\a\r\v]+', ' ', infix_formula.replace('\n', '').lower()).strip(' ')
+
+
+@lru_cache(maxsize=256)
+def _parse(source: str) -> tuple:
+    """Translates normalized formula and compiles it. Result is cached, because bots and players
+    fire the same formulas again and again. lru_cache is thread-safe, so formulas can be created
+    from bot threads as well. Cached objects must never be modified"""
+    postfix_formula = Formula.translate_to_postfix(source)
+    tree = build_tree(postfix_formula)
+    return tuple(postfix_formula), tree, Formula.compile_tree(tree)
+
+
+class Node:
+    """Node of the formula expression tree.
+
+    Token is a number, 'x', an operator or a function name, like in postfix formula.
+    Operators have 2 children and functions have 1, numbers and 'x' are leaves.
+    Trees are built by build_tree, which shares equal subtrees, so the same node can have several parents"""
+
+    __slots__ = ('token', 'children')
+
+    def __init__(self, token, children: tuple = ()):
+        self.token = token
+        self.children = children
+
+    def is_constant(self) -> bool:
+        return type(self.token) != str
+
+    def ordered(self) -> list:
+        """returns all different nodes of the tree, each one after all of its children"""
+        ordered = []
+        visited = set()
+        stack = [(self, False)]
+        while stack:  # not recursive, formulas can be really long
+            node, children_done = stack.pop()
+            if id(node) in visited:
+                continue
+            if children_done:
+                visited.add(id(node))
+                ordered.append(node)
+                continue
+            stack.append((node, True))
+            for child in reversed(node.children):
+                if id(child) not in visited:
+                    stack.append((child, False))
+        return ordered
+
+
+def build_tree(postfix_formula: list) -> Node:
+    """Builds expression tree from valid postfix formula.
+
+    Subexpressions without x are folded into numbers when they evaluate without error, results of operators
+    are clamped to maximum_value like evaluators do. Equal subexpressions are built only once and shared"""
+
+    nodes = {}  # (token, children ids) -> node
+    stack = []
+    for token in postfix_formula:
+        if type(token) != str or token == 'x':
+            children = ()
+        elif token in operators_precedence.keys():
+            b, a = stack.pop(), stack.pop()
+            children = (a, b)
+        else:  # function
+            children = (stack.pop(),)
+
+        if children and all(child.is_constant() for child in children):
+            folded = _fold(token, *(child.token for child in children))
+            if folded is not None:
+                token, children = folded, ()
+
+        if type(token) != str:
+            key = (type(token), token)
+        else:
+            key = (token,) + tuple(id(child) for child in children)
+        if key not in nodes:
+            nodes[key] = Node(token, children)
+        stack.append(nodes[key])
+    return stack.pop()
+
+
+def _fold(token, *arguments):
+    """returns the value of operator or function for constant arguments, or None if it can't be safely folded"""
+    try:
+        arguments = [float(argument) for argument in arguments]  # like constants of evaluators
+        match token:
+            case '+':
+                value = arguments[0] + arguments[1]
+            case '-':
+                value = arguments[0] - arguments[1]
+            case '*':
+                value = arguments[0] * arguments[1]
+            case '/':
+                value = arguments[0] / arguments[1]
+            case '^':
+                value = _power(arguments[0], arguments[1])
+            case '%':
+                value = _modulo(arguments[0], arguments[1])
+            case _:  # function, evaluated exactly like evaluators do
+                with np.errstate(all='ignore'):
+                    value = float(vectorized_functions[token](min(arguments[0], 100) if token == 'exp'
+                                                              else arguments[0]))
+                if not math.isfinite(value):
+                    return None
+                return value
+    except Exception:
+        return None
+    if not math.isfinite(value):
+        return None
+    return float(min(max(value, -maximum_value), maximum_value))  # clamped like evaluators do after operators
+
+
+def _is_number(node: Node, value) -> bool:
+    return node.is_constant() and node.token == value
+
+
+def _make(token, *children) -> Node:
+    """creates a node of derivative tree, simplifying it where result is obvious"""
+    if children and all(child.is_constant() for child in children):
+        folded = _fold(token, *(child.token for child in children))
+        if folded is not None:
+            return Node(folded)
+    if token in operators_precedence.keys():
+        a, b = children
+        if token == '+' and _is_number(a, 0) or token == '*' and _is_number(a, 1):
+            return b
+        if token in ('+', '-') and _is_number(b, 0) or token in ('*', '/', '^') and _is_number(b, 1):
+            return a
+        if token in ('*', '/') and _is_number(a, 0) or token == '*' and _is_number(b, 0):
+            return Node(0)
+        if token == '^' and _is_number(b, 0):
+            return Node(1)
+    return Node(token, children)
+
+
+def differentiate(tree: Node) -> Node:
+    """Returns the tree of the derivative of formula tree by x.
+
+    Clamping of too big values is ignored, the derivative is of the pure expression,
+    but its own intermediate values are clamped when evaluated, as in any formula.
+    Notice, that 'ln' of this module is 1 / ln, so natural logarithms are written with 'log'"""
+
+    ln_10 = Node(math.log(10))
+    derivatives = {}  # node id -> node of its derivative
+    for node in tree.ordered():
+        token = node.token
+        if not node.children:
+            derivatives[id(node)] = Node(1 if token == 'x' else 0)
+            continue
+        if len(node.children) == 2:
+            a, b = node.children
+            da, db = derivatives[id(a)], derivatives[id(b)]
+        else:
+            a, = node.children
+            da = derivatives[id(a)]
+
+        match token:
+            case '+' | '-':
+                derivative = _make(token, da, db)
+            case '*':
+                derivative = _make('+', _make('*', da, b), _make('*', a, db))
+            case '/' if b.is_constant():
+                derivative = _make('/', da, b)
+            case '/':
+                derivative = _make('/', _make('-', _make('*', da, b), _make('*', a, db)), _make('^', b, Node(2)))
+            case '^' if b.is_constant():
+                derivative = _make('*', _make('*', b, _make('^', a, _make('-', b, Node(1)))), da)
+            case '^':
+                # (a ^ b)' = a ^ b * (b' * ln(a) + b * a' / a)
+                derivative = _make('*', node, _make('+', _make('*', db, _make('*', _make('log', a), ln_10)),
+                                                    _make('/', _make('*', b, da), a)))
+            case '%':
+                # a % b = a - b * floor(a / b), where floor(a / b) = (a - a % b) / b
+                derivative = _make('-', da, _make('*', db, _make('/', _make('-', a, node), b)))
+            case 'abs':
+                derivative = _make('/', _make('*', da, a), node)
+            case 'sqrt' | 'rt':
+                derivative = _make('/', da, _make('*', Node(2), node))
+            case 'exp':
+                derivative = _make('*', node, da)
+            case 'tan' | 'tg':
+                derivative = _make('/', da, _make('^', _make('cos', a), Node(2)))
+            case 'sin':
+                derivative = _make('*', _make('cos', a), da)
+            case 'cos':
+                derivative = _make('-', Node(0), _make('*', _make('sin', a), da))
+            case 'log' | 'lg':
+                derivative = _make('/', da, _make('*', a, ln_10))
+            case 'ln':
+                # ln here is 1 / ln, so its derivative is -a' / (a * ln(a) ^ 2) = -a' * (1 / ln(a)) ^ 2 / a
+                derivative = _make('-', Node(0), _make('/', _make('*', da, _make('^', node, Node(2))), a))
+            case _:
+                raise ValueError(f'unknown token {token}')
+        derivatives[id(node)] = derivative
+    return derivatives[id(tree)]
+
+
+def to_infix(tree: Node) -> str:
+    """returns infix formula, which is translated into the same tree"""
+    strings = {}  # node id -> (infix, precedence of its last operator)
+    for node in tree.ordered():
+        token = node.token
+        if node.is_constant():
+            number = str(token) if type(token) == int else np.format_float_positional(token, trim='-')
+            strings[id(node)] = (f'({number})', 10) if number.startswith('-') else (number, 10)
+        elif not node.children:
+            strings[id(node)] = (token, 10)
+        elif len(node.children) == 1:
+            strings[id(node)] = (f'{token}({strings[id(node.children[0])][0]})', 10)
+        else:
+            precedence = operators_precedence[token]
+            (a, a_precedence), (b, b_precedence) = (strings[id(child)] for child in node.children)
+            if a_precedence < precedence:
+                a = f'({a})'
+            if b_precedence <= precedence:
+                b = f'({b})'
+            strings[id(node)] = (f'{a} {token} {b}', precedence)
+    return strings[id(tree)][0]
+
+
 class Formula:
     formula = []
 
     def __init__(self, infix_formula: str):
-        self.formula = self.translate_to_postfix(infix_formula)
-
-    def translate_to_postfix(self, infix_formula: str):
-        if not infix_formula:
+        self.source = normalize(infix_formula)
+        try:
+            postfix_formula, self.tree, self.evaluator = _parse(self.source)
+        except TranslateError:
+            # translating the original string again to point at the error in it, not in the normalized one
+            self.translate_to_postfix(infix_formula)
+            raise
+        self.formula = list(postfix_formula)
+
+    @staticmethod
+    def cache_info():
+        """returns hits, misses, maxsize and currsize of the cache of parsed formulas"""
+        return _parse.cache_info()
+
+    @staticmethod
+    def translate_to_postfix(infix_formula: str):
+        tokens = tokenize(infix_formula)
+        if not tokens:
             raise TranslateError  # if infix_formula is empty
 
-        # preparing string to translate
-        infix_formula = infix_formula.replace('\n', '')
-        infix_formula = infix_formula.lower()
-        if infix_formula[0] == '-':
-            infix_formula = '0' + infix_formula
-        infix_formula = re.sub(r'\(\s*-', '(0-', infix_formula)  # adding 0 before unary '-'
-        infix_formula = re.sub(r'(\d)\s*([a-zA-Z(])', r'\1*\2', infix_formula)  # adding '*' signs
-        infix_formula = re.sub(r'\)\(', ')*(', infix_formula)
-        infix_formula = re.sub(r':', '/', infix_formula)  # changing ':' to '/'
-        infix_formula = re.sub(r'\)\s*([a-zA-Z]+)', r')*\1', infix_formula)  # adding '*' between ')' and word
-
-        postfix_formula = []
-        operators_stack = []
-        i = -1
-        while i + 1 < len(infix_formula):  # while infix_formula has more than 1 element
-            i += 1
-
-            symbol_to_parse = infix_formula[i]
-
-            if symbol_to_parse in (' ', '\t', '\a', '\r', '\v'):  # skipping whitespaces
-                continue
-
-            if symbol_to_parse.isdigit():  # numbers
-                num = symbol_to_parse
-                while (i + 1 < len(infix_formula)) and (infix_formula[i + 1].isdigit() or infix_formula[i + 1] == '.'):
-                    i += 1
-                    num += infix_formula[i]
-                # adding number to the output
-                try:
-                    postfix_formula.append(float(num) if '.' in num else int(num))
-                except Exception:
-                    raise NumberError  # if number is wrong (more than 1 point for example)
-
-            elif symbol_to_parse in operators_precedence.keys():  # operators
-
-                if symbol_to_parse == '(':
-                    operators_stack.append('(')
-
-                elif symbol_to_parse == ')':
-                    try:
-                        # pop all operators from stack until '(' is popped operator and  put them to the output
-                        top_el = operators_stack.pop()
-                        while not top_el == '(':
-                            postfix_formula.append(top_el)
-                            top_el = operators_stack.pop()
-
-                        # if before '(' was a function, pop it from stack to the output
-                        if len(operators_stack) and (operators_stack[-1] in functions):
-                            postfix_formula.append(operators_stack.pop())
-                    except Exception:
-                        raise ParenthesesError
+        postfix_tokens = []
+        operators_stack = []  # operators, functions and '('
 
-                else:
-                    current_operator_precedence = operators_precedence[symbol_to_parse]
-
-                    # if operator(func) on the top of stack has higher precedence, and it is not '('
-                    # then pop it into output before push current operator on stack
-                    while len(operators_stack) and (not operators_stack[-1] == '('):
-                        token = operators_stack[-1]  # token on the top of stack
-                        if token in functions.keys():  # if function on the top of stack
-                            if current_operator_precedence < functions_precedence:
-                                postfix_formula.append(operators_stack.pop())
-                                continue
-                            break
-                        elif operators_precedence[
-                            token] >= current_operator_precedence:  # if operator on the top of stack
-                            postfix_formula.append(operators_stack.pop())
-                        else:
-                            break
-                    operators_stack.append(symbol_to_parse)
-
-            elif symbol_to_parse.isalpha():  # constants and functions
-                token_end_index = i
-
-                while token_end_index < len(infix_formula) and infix_formula[token_end_index].isalpha():
-                    token_end_index += 1
-
-                token = infix_formula[i:token_end_index]  # getting whole token to analyze
-                i = token_end_index - 1  # skipping all token
+        for token in tokens:
+            if token.kind == 'number':
+                postfix_tokens.append(token)
 
-                if token == 'x':
-                    postfix_formula.append('x')
-                elif token in constants.keys():
-                    postfix_formula.append(constants[token])
-                elif token in functions.keys():
+            elif token.kind == 'identifier':
+                if token.value == 'x':
+                    postfix_tokens.append(token)
+                elif token.value in constants.keys():
+                    postfix_tokens.append(Token('number', constants[token.value], token.column))
+                elif token.value in functions.keys():
                     operators_stack.append(token)
                 else:
-                    raise TokenError
-
-            else:
-                raise TokenError  # unknown token
+                    raise TokenError(token.column)
+
+            elif token.value == '(':
+                operators_stack.append(token)
+
+            elif token.value == ')':
+                # pop all operators from stack until '(' is popped operator and  put them to the output
+                while operators_stack and operators_stack[-1].value != '(':
+                    postfix_tokens.append(operators_stack.pop())
+                if not operators_stack:
+                    raise ParenthesesError(token.column)
+                operators_stack.pop()
+
+                # if before '(' was a function, pop it from stack to the output
+                if operators_stack and operators_stack[-1].kind == 'identifier':
+                    postfix_tokens.append(operators_stack.pop())
+
+            else:  # operator
+                current_operator_precedence = operators_precedence[token.value]
+
+                # if operator(func) on the top of stack has higher precedence, and it is not '('
+                # then pop it into output before push current operator on stack
+                while operators_stack and operators_stack[-1].value != '(':
+                    top = operators_stack[-1]
+                    if top.kind == 'identifier':  # if function on the top of stack
+                        if current_operator_precedence < functions_precedence:
+                            postfix_tokens.append(operators_stack.pop())
+                            continue
+                        break
+                    elif operators_precedence[top.value] >= current_operator_precedence:
+                        postfix_tokens.append(operators_stack.pop())
+                    else:
+                        break
+                operators_stack.append(token)
 
         # popping all operators from stack
-        if '(' not in operators_stack:
-            if operators_stack:
-                while operators_stack:
-                    postfix_formula.append(operators_stack.pop())
-        else:
-            raise ParenthesesError
-
-        # checking if amount of operands and operators_precedence is appropriate
-        try:
-            postfix_formula_copy = postfix_formula.copy()
-            while len(infix_formula) > 1:
-                for i in range(len(postfix_formula_copy)):
-                    if type(postfix_formula_copy[i]) == str and (not postfix_formula_copy[i] == 'x'):
-                        if postfix_formula_copy[i] in operators_precedence.keys():
-                            for _ in range(2):
-                                postfix_formula_copy.pop(i - 1)
-                        else:
-                            postfix_formula_copy.pop(i)
-                        break
-                else:  # if no operators_precedence found
-                    if len(postfix_formula_copy) > 1:
-                        raise TokenError
-                    if type(postfix_formula_copy[0]) == str and not postfix_formula_copy[0] == 'x':
-                        raise TokenError
-                    break
-        except Exception:
-            raise TokenError
+        while operators_stack:
+            token = operators_stack.pop()
+            if token.value == '(':
+                raise ParenthesesError(token.column)
+            postfix_tokens.append(token)
+
+        # checking if amount of operands and operators_precedence is appropriate:
+        # operands stack must never have fewer values than the arity and must end with exactly one value.
+        # Only the column where each value starts is kept, to point at the error
+        operands = []
+        for token in postfix_tokens:
+            if token.kind == 'number' or token.value == 'x':
+                operands.append(token.column)
+            elif token.kind == 'operator':
+                if len(operands) < 2:
+                    raise TokenError(token.column)
+                operands.pop()
+            elif not operands:  # function
+                raise TokenError(token.column)
+        if len(operands) != 1:
+            raise TokenError(operands[1] if operands else None)
+
+        return [token.value for token in postfix_tokens]
+
+    @staticmethod
+    def compile_tree(tree: Node):
+        """Turns expression tree into a straight-line python function of x.
+
+        Every node becomes one assignment in the generated code, so evaluation of a point is a single
+        function call. Nodes shared by several parents are computed only once.
+        Results are equal to evaluate_many bit-for-bit: plain python is used only where it rounds exactly like
+        numpy (arithmetic, abs, sqrt, sin, cos), the rest calls the same numpy functions.
+        Bad arguments are checked before the call, so numpy never has to warn"""
+
+        namespace = {'maximum_value': maximum_value, 'power': _power, 'isnan': math.isnan,
+                     'DividingZero': DividingZero, 'ArgumentOutOfRange': ArgumentOutOfRange,
+                     'EvaluatingError': EvaluatingError, 'abs': abs, 'sqrt': math.sqrt, 'rt': math.sqrt,
+                     'sin': math.sin, 'cos': math.cos, 'tan': np.tan, 'tg': np.tan, 'exp': np.exp,
+                     'log': np.log10, 'lg': np.log10, 'ln': np.log}
+        lines = ['    x = float(x)']
+        names = {}  # node id -> name of variable keeping its value
+        for n, node in enumerate(tree.ordered()):
+            name = f't{n}'
+            token = node.token
+            if type(token) != str:  # number or constant
+                namespace[name] = float(token)
+                names[id(node)] = name
+                continue
+            if token == 'x':
+                names[id(node)] = 'x'
+                continue
 
-        return postfix_formula
+            if token in operators_precedence.keys():
+                a, b = (names[id(child)] for child in node.children)
+                match token:
+                    case '+':
+                        lines.append(f'    {name} = {a} + {b}')
+                    case '-':
+                        lines.append(f'    {name} = {a} - {b}')
+                    case '*':
+                        lines.append(f'    {name} = {a} * {b}')
+                    case '/':
+                        lines.append(f'    if not {b}: raise DividingZero')
+                        lines.append(f'    {name} = {a} / {b}')
+                    case '^':
+                        lines.append(f'    {name} = power({a}, {b})')
+                    case '%':
+                        lines.append(f'    if not {b}: raise ArgumentOutOfRange')
+                        lines.append(f'    {name} = {a} % {b}')
+                # defending from too big numbers
+                lines.append(f'    if {name} > maximum_value: {name} = maximum_value')
+                lines.append(f'    elif {name} < -maximum_value: {name} = -maximum_value')
+            else:  # function
+                a = names[id(node.children[0])]
+                match token:
+                    case 'exp':
+                        lines.append(f'    {name} = exp(100.0 if {a} > 100 else {a})')
+                    case 'ln':
+                        lines.append(f'    if {a} <= 0 or {a} == 1: raise ArgumentOutOfRange')
+                        lines.append(f'    {name} = 1 / ln({a})')
+                    case 'sqrt' | 'rt':
+                        lines.append(f'    if {a} < 0: raise ArgumentOutOfRange')
+                        lines.append(f'    {name} = {token}({a})')
+                    case 'log' | 'lg':
+                        lines.append(f'    if {a} <= 0: raise ArgumentOutOfRange')
+                        lines.append(f'    {name} = {token}({a})')
+                    case _:
+                        lines.append(f'    {name} = {token}({a})')
+            names[id(node)] = name
+
+        result = names[id(tree)]
+        lines.append(f'    if isnan({result}): raise EvaluatingError')
+        lines.append(f'    if {result} > maximum_value: return maximum_value')
+        lines.append(f'    if {result} < -maximum_value: return -maximum_value')
+        lines.append(f'    return float({result})')
+
+        lines.insert(0, 'def evaluator(x):')
+        exec(compile('\n'.join(lines), '<formula>', 'exec'), namespace)
+        return namespace['evaluator']
+
+    def canonical(self) -> str:
+        """returns infix formula, which is the same for all formulas translated into the same tree,
+        like '2x' and '2 * x'"""
+        return to_infix(self.tree)
+
+    def derivative(self):
+        """returns new Formula of the derivative of this one by x"""
+        return Formula(to_infix(differentiate(self.tree)))
 
     def evaluate(self, argument: float = 0) -> float:
-        tokens = self.formula.copy()
         try:
-            while len(tokens) > 1:
-                i = 0
-                while 0 <= i < len(tokens):
-                    token = tokens[i]
-                    if type(token) == str:
-                        if token == 'x':
-                            tokens[i] = argument
-                        elif token in operators_precedence.keys():
-                            a, b = tokens[i - 2], tokens[i - 1]
-                            match token:
-                                case '+':
-                                    value = a + b
-                                case '-':
-                                    value = a - b
-                                case '*':
-                                    value = a * b
-                                case '/':
-                                    if b:
-                                        value = a / b
-                                    else:
-                                        raise DividingZero
-                                case '^':
-                                    try:
-                                        if a < 0:
-                                            if not (b - int(b)) < 10 / maximum_value:
-                                                raise ArgumentOutOfRange
-                                            else:
-                                                b = int(b)
-                                        value = a ** b
-                                    except ValueError:
-                                        value = maximum_value
-                                case '%':
-                                    try:
-                                        value = a % b
-                                    except Exception:
-                                        raise ArgumentOutOfRange
-                            tokens.pop(i - 1)
-                            tokens.pop(i - 1)
-                            if value > maximum_value:
-                                value = maximum_value + 10 * random.random()  # defending from too big numbers
-                            if value < -maximum_value:
-                                value = -maximum_value + 10 * random.random()
-                            tokens[i - 2] = value
-                            i -= 2
-                        else:
-                            if token == 'exp' and tokens[i - 1] > 100:
-                                tokens[i - 1] = 100 + 2 * random.random()
-                            tokens[i - 1] = functions[token](tokens[i - 1])
-                            tokens.pop(i)
-                            i -= 1
-                    i += 1
-                else:  # no operators_precedence found
-                    break
-            if len(tokens) == 0:
-                raise EvaluatingError
-            if tokens[-1] == 'x':
-                return argument
-            if tokens[-1] > maximum_value:
-                return maximum_value
-            if tokens[-1] < -maximum_value:
-                return -maximum_value
-            return float(tokens[-1])
+            return self.evaluator(argument)
+        except EvaluatingError:
+            raise
         except Exception:
             raise EvaluatingError
+
+    def evaluate_many(self, arguments) -> tuple:
+        """Evaluates formula for the whole array of arguments at once.
+
+        Returns array of values and boolean mask of the same shape, which is False where the formula is undefined
+        (dividing by zero, argument out of function domain, bad '^' and so on). Values are nan there.
+        Nothing is raised for a single bad point."""
+
+        arguments = np.asarray(arguments, dtype=float)
+        defined = np.ones(arguments.shape, dtype=bool)
+        nodes = self.tree.ordered()
+
+        # how many times value of each node will be used yet, to free arrays as soon as possible
+        uses = {}
+        for node in nodes:
+            for child in node.children:
+                uses[id(child)] = uses.get(id(child), 0) + 1
+        values = {}
+
+        with np.errstate(all='ignore'):
+            for node in nodes:
+                token = node.token
+                if type(token) != str:  # number or constant
+                    value = np.full(arguments.shape, token, dtype=float)
+                elif token == 'x':
+                    value = arguments
+                elif token in operators_precedence.keys():
+                    a, b = (values[id(child)] for child in node.children)
+                    match token:
+                        case '+':
+                            value = a + b
+                        case '-':
+                            value = a - b
+                        case '*':
+                            value = a * b
+                        case '/':
+                            defined &= b != 0
+                            value = a / b
+                        case '^':
+                            negative_base = a < 0
+                            defined &= ~negative_base | (b - np.trunc(b) < 10 / maximum_value)
+                            value = np.power(a, np.where(negative_base, np.trunc(b), b))
+                            defined &= np.isfinite(value) | ~(np.isfinite(a) & np.isfinite(b))  # overflow
+                        case '%':
+                            defined &= b != 0
+                            value = np.mod(a, b)
+                    value = np.clip(value, -maximum_value, maximum_value)  # defending from too big numbers
+                else:  # function
+                    a = values[id(node.children[0])]
+                    if token == 'exp':
+                        a = np.where(a > 100, 100.0, a)
+                    value = vectorized_functions[token](a)
+                    defined &= np.isfinite(value) | ~np.isfinite(a)  # out of function domain
+                values[id(node)] = value
+
+                for child in node.children:
+                    uses[id(child)] -= 1
+                    if not uses[id(child)]:
+                        del values[id(child)]
+
+            result = np.clip(values[id(self.tree)], -maximum_value, maximum_value)
+        defined &= ~np.isnan(result)
+        result[~defined] = np.nan
+        return result, defined
+
+    def evaluate_interval(self, x_low: float, x_high: float):
+        """Returns (y_low, y_high) bounds, which are guaranteed to contain every value of the formula on
+        [x_low, x_high], where it is defined. Returns None if the formula is undefined on the whole interval.
+
+        Bounds are conservative, so they can be much wider than real ones, but never narrower.
+        See evaluate_intervals to bound many intervals at once"""
+
+        y_low, y_high, _ = self.evaluate_intervals([x_low], [x_high])
+        if np.isnan(y_low[0]):
+            return None
+        return float(y_low[0]), float(y_high[0])
+
+    def evaluate_intervals(self, x_lows, x_highs) -> tuple:
+        """Bounds formula values on every interval [x_lows[i], x_highs[i]] at once, see tree_intervals"""
+        return self.tree_intervals(self.tree, x_lows, x_highs)
+
+    @staticmethod
+    def tree_intervals(tree: Node, x_lows, x_highs) -> tuple:
+        """Bounds values of expression tree on every interval [x_lows[i], x_highs[i]] by interval arithmetic.
+
+        Returns arrays of low and high bounds, which contain every value of the tree on the interval, where it's
+        defined (nan if it's undefined on the whole interval), and boolean array, which is True where the tree is
+        proven to be defined and continuous on the whole interval and none of its values is clamped, so its
+        derivative (see differentiate) is the real one wherever it exists.
+        Bounds are conservative, so they can be much wider than real ones, but never narrower.
+        It's used to skip collision tests for parts of the graph, which can't touch anything,
+        and to prove that sampled trajectory is close to the graph"""
+
+        x_lows, x_highs = np.asarray(x_lows, dtype=float), np.asarray(x_highs, dtype=float)
+        x_lows, x_highs = np.minimum(x_lows, x_highs), np.maximum(x_lows, x_highs)
+        bounds = {}
+        with np.errstate(all='ignore'):
+            for node in tree.ordered():
+                token = node.token
+                if type(token) != str:  # number or constant
+                    low = high = np.full(x_lows.shape, token, dtype=float)
+                    # bigger numbers can be results of folding, which were clamped
+                    continuous = np.full(x_lows.shape, abs(token) < maximum_value)
+                    bounds[id(node)] = low, high, continuous
+                    continue
+                if token == 'x':
+                    bounds[id(node)] = x_lows, x_highs, np.ones(x_lows.shape, dtype=bool)
+                    continue
+
+                children = [bounds[id(child)] for child in node.children]
+                if token in operators_precedence.keys():
+                    (a_low, a_high, a_continuous), (b_low, b_high, b_continuous) = children
+                    low, high, continuous, empty = _operator_intervals(token, a_low, a_high, b_low, b_high)
+                    # defending from too big numbers like evaluators do, values aren't continuous where clamped
+                    continuous &= a_continuous & b_continuous & (low > -maximum_value) & (high < maximum_value)
+                    low, high = np.clip(low, -maximum_value, maximum_value), \
+                        np.clip(high, -maximum_value, maximum_value)
+                else:  # function
+                    (a_low, a_high, a_continuous), = children
+                    low, high, continuous, empty = _function_intervals(token, a_low, a_high)
+                    continuous &= a_continuous
+                for child_low, _, _ in children:
+                    empty |= np.isnan(child_low)  # argument is undefined everywhere
+
+                # numpy functions and power round differently than basic operators, so they get wider margins
+                low, high = _outward(low, high, 4 if token == '^' or token in functions.keys() else 1)
+                bounds[id(node)] = np.where(empty, np.nan, low), np.where(empty, np.nan, high), continuous & ~empty
+
+        low, high, continuous = bounds[id(tree)]
+        continuous = continuous & (low > -maximum_value) & (high < maximum_value)
+        return np.clip(low, -maximum_value, maximum_value), np.clip(high, -maximum_value, maximum_value), continuous
+
+
+def _outward(low, high, units: int = 1):
+    """widens bounds by units in the last place, to cover rounding of floating point operations"""
+    for _ in range(units):
+        low, high = np.nextafter(low, -np.inf), np.nextafter(high, np.inf)
+    return low, high
+
+
+def _operator_intervals(token, a_low, a_high, b_low, b_high):
+    """Bounds of operator results for arrays of operands bounds.
+
+    Returns arrays of low and high bounds, mask of intervals, where the operator is continuous
+    and mask of intervals, where it's undefined for all operands"""
+    shape = np.broadcast(a_low, b_low).shape
+    continuous, empty = np.ones(shape, dtype=bool), np.zeros(shape, dtype=bool)
+    match token:
+        case '+':
+            low, high = a_low + b_low, a_high + b_high
+        case '-':
+            low, high = a_low - b_high, a_high - b_low
+        case '*':
+            products = np.stack((a_low * b_low, a_low * b_high, a_high * b_low, a_high * b_high))
+            products[np.isnan(products)] = 0  # zero by infinity
+            low, high = products.min(axis=0), products.max(axis=0)
+        case '/':
+            empty = (b_low == 0) & (b_high == 0)
+            continuous = (b_low > 0) | (b_high < 0)
+            low, high, _, _ = _operator_intervals('*', a_low, a_high, 1 / b_high, 1 / b_low)
+            low, high = np.where(continuous, low, -np.inf), np.where(continuous, high, np.inf)
+        case '^':
+            low, high, continuous, empty = _power_intervals(a_low, a_high, b_low, b_high)
+        case '%':
+            empty = (b_low == 0) & (b_high == 0)
+            # whole interval in one period of constant divisor, remainder is a shifted argument there
+            periods = np.floor(a_low / b_low)
+            continuous = (b_low == b_high) & np.isfinite(a_low) & np.isfinite(a_high) & \
+                (periods == np.floor(a_high / b_low)) & ~empty
+            shift = b_low * periods
+            rounding = np.abs(shift) * 2 ** -51  # of the shift, which can be much bigger than the remainder
+            # otherwise remainder has the sign of divisor and is less by absolute value
+            low = np.where(continuous, a_low - shift - rounding, np.minimum(b_low, 0))
+            high = np.where(continuous, a_high - shift + rounding, np.maximum(b_high, 0))
+    # infinity minus infinity, the value can be anything
+    return np.where(np.isnan(low), -np.inf, low), np.where(np.isnan(high), np.inf, high), continuous, empty
+
+
+def _power_intervals(a_low, a_high, b_low, b_high):
+    """bounds of '^' results, returned like _operator_intervals does"""
+    integer = (b_low == b_high) & (b_low == np.trunc(b_low))  # the only exponent possible for negative base
+    n = np.where(integer, b_low, 0)
+
+    # integer exponent, it's bounded for absolute value of it first
+    low, high = np.power(a_low, np.abs(n)), np.power(a_high, np.abs(n))
+    odd = np.abs(n) % 2 == 1
+    monotonic, decreasing = odd | (a_low >= 0), a_high <= 0
+    integer_low = np.where(monotonic, low, np.where(decreasing, high, 0))
+    integer_high = np.where(monotonic, high, np.where(decreasing, low, np.maximum(low, high)))
+    around_zero = (a_low <= 0) & (a_high >= 0)
+    negative = n < 0
+    integer_low, integer_high = \
+        np.where(negative, np.where(integer_high != 0, 1 / integer_high, -np.inf), integer_low), \
+        np.where(negative, np.where(integer_low != 0, 1 / integer_low, np.inf), integer_high)
+    integer_low = np.where(negative & around_zero, -np.inf, np.where(n == 0, 1, integer_low))
+    integer_high = np.where(negative & around_zero, np.inf, np.where(n == 0, 1, integer_high))
+
+    # for positive base power is monotonic by each argument, so extremes are in the corners
+    corners = np.stack([np.power(base, exponent) for base in (a_low, a_high) for exponent in (b_low, b_high)])
+    unbounded = (a_low < 0) | ((a_low == 0) & (b_low <= 0)) | np.isnan(corners).any(axis=0)  # only clamping
+    corners_low = np.where(unbounded, -np.inf, corners.min(axis=0))
+    corners_high = np.where(unbounded, np.inf, corners.max(axis=0))
+
+    low, high = np.where(integer, integer_low, corners_low), np.where(integer, integer_high, corners_high)
+    continuous = np.where(integer, ~(negative & around_zero), (a_low > 0) | ((a_low >= 0) & (b_low > 0)))
+    # negative base with constant fractional exponent
+    empty = ~integer & (a_high < 0) & (b_low == b_high) & ~(b_low - np.trunc(b_low) < 10 / maximum_value)
+    return low, high, continuous, empty
+
+
+def _function_intervals(token, low, high):
+    """bounds of function results for arrays of argument bounds, returned like _operator_intervals does"""
+    continuous, empty = np.ones(low.shape, dtype=bool), np.zeros(low.shape, dtype=bool)
+    match token:
+        case 'abs':
+            low, high = np.where(low >= 0, low, np.where(high <= 0, -high, 0)), \
+                np.where(low >= 0, high, np.where(high <= 0, -low, np.maximum(-low, high)))
+        case 'sqrt' | 'rt':
+            empty, continuous = high < 0, low >= 0
+            low, high = np.sqrt(np.maximum(low, 0)), np.sqrt(high)
+        case 'exp':
+            # arguments higher than 100 are replaced with 100, its derivative is wrong there
+            continuous = high <= 100
+            low, high = np.exp(np.minimum(low, 100)), np.exp(np.minimum(high, 100))
+        case 'log' | 'lg':
+            empty, continuous = high <= 0, low > 0
+            low, high = np.where(low > 0, np.log10(low), -np.inf), np.log10(high)
+        case 'ln':
+            # it's 1 / ln, decreasing on both (0, 1) and (1, inf)
+            around_one = (low <= 1) & (high >= 1)
+            empty, continuous = high <= 0, (low > 0) & ~around_one
+            low, high = np.where(around_one, -np.inf, 1 / np.log(high)), \
+                np.where(around_one, np.inf, np.where(low > 0, 1 / np.log(low), 0))
+        case 'tan' | 'tg':
+            continuous = np.isfinite(low) & np.isfinite(high) & \
+                (np.floor(low / np.pi - 0.5) == np.floor(high / np.pi - 0.5))  # no asymptote inside
+            low, high = np.where(continuous, np.tan(low), -np.inf), np.where(continuous, np.tan(high), np.inf)
+        case 'sin' | 'cos':
+            function = vectorized_functions[token]
+            values = function(low), function(high)
+            # maximums of sin are in pi/2 + 2pi*k, of cos in 2pi*k; minimums are pi further
+            peak = np.pi / 2 if token == 'sin' else 0
+            whole = ~(np.isfinite(low) & np.isfinite(high)) | (high - low >= 2 * np.pi)
+            with_peak = whole | (np.floor((high - peak) / (2 * np.pi)) != np.floor((low - peak) / (2 * np.pi)))
+            with_trough = whole | (np.floor((high - peak - np.pi) / (2 * np.pi)) !=
+                                   np.floor((low - peak - np.pi) / (2 * np.pi)))
+            low, high = np.where(with_trough, -1, np.minimum(*values)), np.where(with_peak, 1, np.maximum(*values))
+    return low, high, continuous, empty
+
+
+def _power(a, b):
+    """'^' for a single pair of values, the same as evaluate_many does for arrays.
+
+    numpy computes power of two arrays differently than of two numbers (or of an array and a number),
+    so it's called on one-element arrays to get exactly the same result"""
+    if a < 0:
+        if not (b - np.trunc(b)) < 10 / maximum_value:
+            raise ArgumentOutOfRange
+        b = np.trunc(b)
+    with np.errstate(all='ignore'):  # overflow is checked right here
+        value = np.power(np.array([a], dtype=float), np.array([b], dtype=float))[0]
+    if not math.isfinite(value) and math.isfinite(a) and math.isfinite(b):
+        raise ArgumentOutOfRange  # overflow or zero to a negative power
+    return value
+
+
+def _modulo(a, b):
+    """'%' for a single pair of values, the same as evaluate_many does for arrays (python's % is np.mod)"""
+    if not b:
+        raise ArgumentOutOfRange
+    return a % b
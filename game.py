@@ -20,9 +20,10 @@ import random
 import math
 import sys
 import time
-from threading import Timer
+from collections import OrderedDict
+from queue import Queue, Empty
+from threading import Timer, Thread, Event, Lock
 
-import pyglet.graphics
 import shapely
 
 from UIFixedElements import *
@@ -30,11 +31,14 @@ from arcade import shape_list
 from arcade import gui, color, load_texture, Text, SpriteList, View, Window
 import arcade.types
 
-from formula import Formula, TranslateError, ArgumentOutOfRange
+from formula import Formula, TranslateError, EvaluatingError
+from maps import map_pool, GameMap
+from obstacle_renderer import ObstacleRenderer
+from obstacles import ObstacleIndex
 from player import Player
+from trajectory import sample_range, polyline_segments, circles_entry, refine_contacts, ShotResult
 import numpy as np
-import tripy
-from shapely import Point, Polygon, LineString
+from shapely import Point, Polygon
 
 if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
     os.chdir(sys._MEIPASS)
@@ -42,6 +46,8 @@ if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
 
 class Game:
     _proportion_x2y_max = 2.383
+    _empty_chunk_width = 1  # width of game field chunks, checked for being empty before the shot, in units for 16 y
+    _shot_piece_width = 4  # x width of trajectory pieces, resolved and streamed one by one, in units for 16 y
 
     def __init__(self, left_team: list = [], right_team: list = [], multiplayer: bool = False, axes_marked: bool = True,
                  marks_frequency: int = 5, proportion_x2y: float = 2.383,
@@ -53,7 +59,10 @@ class Game:
         self.max_time_s = max_time_s
         self.timer_time = max_time_s  # in-game timer time
         self.obstacles = []  # list of obstacle polygons
+        self.obstacle_index = ObstacleIndex(self.obstacles)  # change obstacles only through it after creation
         self.obstacle_frequency = 20  # average obstacle frequency in %
+        self.map_pool = map_pool  # maps generated in advance for the next rounds, shared by all games
+        self.game_map: GameMap = None  # the current map, can be saved by maps.write_map
 
         # marks on axes
         self.axes_marked = axes_marked
@@ -75,89 +84,55 @@ class Game:
         self.shooting = False
         self.formula_current_x = None  # when shooting, shows the relative x of the end of last segment
         self.formula = None  # Formula class object
+        self.shot: ShotResult = None  # the current shot, resolved when it starts
+        self.map_version = 0  # changed every time obstacles or living players change, shot results depend on it
+        self.shot_cache_size = 64  # maximum number of cached shot results
+        self._shot_cache = OrderedDict()  # (formula, shooter position, map version, tolerance) -> ShotResult
+        self._shot_cache_lock = Lock()  # shots are resolved in worker threads
+        self._shot_cache_hits = 0
+        self._shot_cache_misses = 0
+        self.trajectory_tolerance = 0.02  # maximum distance between the graph and its drawn segments in game units
+        self.shot_speed = 15  # x distance, passed by the shot every second, in units for 16 y
+        self.shot_frame_budget = 0.004  # maximum time in seconds for showing the shot in one frame
         self.obstacles_color = ()
         self.obstacles_border_color = ()
 
         # list of formula segments
         self.formula_segments = shape_list.ShapeElementList()
 
-    def create_obstacles(self):
-        """generates obstacle on server machine using axes units coordinates,
-        so these obstacles will be independent of screen resolution and before drawing
-        must be scaled.
-
-        These coordinates are common to all player and provides reference data to calculate
-        collision."""
-
-        self.obstacles.clear()  # deleting old obstacles
+    def map_settings(self) -> tuple:
+        """returns settings tuple of the map for the current game parameters, see maps.GameMap"""
         max_polygons = int(self.obstacle_frequency * 0.8 * self.proportion_x2y / self._proportion_x2y_max)
-        for i in range(
-                int(max_polygons * (1 + random.uniform(-0.15, 0.15)))):  # creating +-15% from max_polygons times
-            """generating new polygon"""
-            while True:
-                vertices = random.randint(3, 20)  # quantity of vertices in current polygon
-                # polygons with more vertices normally will be bigger than other
-                max_radius = int(random.uniform(1 * self.game_field_ratio,
-                                                8 * self.game_field_ratio + 0.25 * self.game_field_ratio * vertices))
-
-                # generating angles as part of 2 Pi radians:
-                angle_sum = 0
-                angles = []
-                for _ in range(vertices):
-                    angles.append(random.randint(35, 100))
-                    angle_sum += angles[-1]
-                for angle in range(vertices):
-                    angles[angle] = angles[angle] / angle_sum
-
-                point_list = []
-                center_x = random.uniform(max_radius - self.x_edge, self.x_edge - max_radius)
-                center_y = random.uniform(max_radius - self.y_edge, self.y_edge - max_radius)
-                angle = 0
-                last_scale = 0.75
-                for part in angles:
-                    angle -= 2 * math.pi * part
-                    scale = random.uniform(0.25, 1)
-                    scale = (scale + last_scale / 2) * 2 / 3  # making polygon more convex by smoothing angles
-                    last_scale = scale
-                    point_list.append(
-                        (center_x + scale * max_radius * math.cos(angle),
-                         center_y + scale * max_radius * math.sin(angle)
-                         )
-                    )
-                polygon = Polygon(point_list)
-
-                # checking polygon for collision with other obstacles
-                is_intersecting = False
-                for obstacle in self.obstacles:
-                    if polygon.intersects(obstacle):
-                        is_intersecting = True
-                        break
-                if is_intersecting:
-                    continue
-
-                # checking for collision with players
-                for player in self.all_players:
-                    player_polygon = shapely.geometry.box(
-                        player.x - player.player_size / 2, player.y - player.player_size / 2,
-                        player.x + player.player_size / 2, player.y + player.player_size / 2
-                    )
-                    if player_polygon.intersects(polygon):
-                        is_intersecting = True
-                        break
-                if is_intersecting:
-                    continue
-                break
-            self.obstacles.append(polygon)
-
-    def prepare(self):
+        return (self.x_edge, self.y_edge, self.game_field_ratio, max_polygons,
+                Player.standard_height * self.game_field_ratio, len(self.left_team), len(self.right_team))
+
+    def load_map(self, game_map: GameMap):
+        """replaces obstacles by the map ones and places players on its spawn points"""
+        self.game_map = game_map
+        self.obstacles[:] = game_map.obstacles
+        self.obstacle_index.rebuild()
+        self.map_version += 1
+        player_size = game_map.settings[4]
+        for player, (x, y) in zip(self.left_team + self.right_team, game_map.spawns):
+            player.x, player.y = float(x), float(y)
+            player.player_size = player_size
+            player.hitbox_radius = player_size / 2 * 0.9
+
+    def prepare(self, game_map: GameMap = None):
+        """prepares the game for the next round on game_map (see maps.read_map and maps.generate_map),
+        map from the pool is used if it isn't given. The map must be made for the current map_settings"""
         self.timer_time = self.max_time_s
         self.prev_active_player = None
         self.players_sprites_list = SpriteList(use_spatial_hash=True)
         self.shooting = False
         self.formula_current_x = None
+        self.shot = None
         self.formula_segments = shape_list.ShapeElementList()
         self.all_players = self.left_team + self.right_team
         self.game_field_ratio = self.y_edge / 16
+        if game_map and game_map.settings != self.map_settings():
+            raise ValueError('the map is made for other game settings')
+        self.map_version += 1  # players are revived
 
         # choosing obstacles color
         self.obstacles_color = random.choice(
@@ -174,6 +149,190 @@ class Game:
             player.left_player = True
             player.alive = True
 
+        # ready map is usually waiting in the pool, so the next one is generated in background
+        self.load_map(game_map or self.map_pool.take(self.map_settings()))
+
+    def get_empty_chunks(self, formula: Formula, y_delta: float) -> np.ndarray:
+        """Splits game field into vertical chunks and returns boolean array, which is True for every chunk,
+        where the graph of formula lifted by y_delta can't touch any obstacle or player hitbox.
+
+        Uses conservative interval bounds of formula values, so a chunk, which can be touched, is never
+        marked as empty, but some empty chunks may be not marked"""
+
+        chunk_width = self._empty_chunk_width * self.game_field_ratio
+        hitboxes_bounds = [(player.x - player.hitbox_radius, player.y - player.hitbox_radius,
+                            player.x + player.hitbox_radius, player.y + player.hitbox_radius)
+                           for player in self.all_players]
+        shapes_bounds = np.concatenate((shapely.bounds(self.obstacles).reshape(-1, 4),
+                                        np.array(hitboxes_bounds).reshape(-1, 4)))
+        x_low = np.arange(math.ceil(2 * self.x_edge / chunk_width)) * chunk_width - self.x_edge
+        x_high = x_low + chunk_width
+        y_low, y_high, _ = formula.evaluate_intervals(x_low, x_high)  # nan where formula isn't defined at all
+        y_low, y_high = y_low + y_delta - 1e-9, y_high + y_delta + 1e-9
+        # chunks x shapes
+        touching = (shapes_bounds[None, :, 0] <= x_high[:, None]) & (shapes_bounds[None, :, 2] >= x_low[:, None]) & \
+                   (shapes_bounds[None, :, 1] <= y_high[:, None]) & (shapes_bounds[None, :, 3] >= y_low[:, None])
+        return np.isnan(y_low) | ~touching.any(axis=1)
+
+    def in_empty_chunks(self, empty_chunks: np.ndarray, x_low, x_high):
+        """checks if the whole [x_low, x_high] range is inside the chunks marked as empty by get_empty_chunks,
+        x_low and x_high can be arrays of ranges to check them all at once"""
+        chunk_width = self._empty_chunk_width * self.game_field_ratio
+        first_chunk = np.clip((np.asarray(x_low) + self.x_edge) // chunk_width, 0, len(empty_chunks) - 1).astype(int)
+        last_chunk = np.clip((np.asarray(x_high) + self.x_edge) // chunk_width, 0, len(empty_chunks) - 1).astype(int)
+        not_empty_before = np.concatenate(([0], np.cumsum(~empty_chunks)))  # number of not empty chunks before
+        return not_empty_before[last_chunk + 1] == not_empty_before[first_chunk]
+
+    def simulate_shot(self, formula: Formula, stream: Queue = None, cancelled: Event = None) -> ShotResult:
+        """Resolves the whole shot of the active player: samples the graph of formula, lifted to start
+        from the player, up to the end of the game field and finds where it stops and whom it kills.
+        Nothing is changed here, the result is applied by the view while the shot is shown.
+
+        The trajectory is resolved piece by piece along x, so it can be run in a worker thread and shown
+        before it's finished: every piece is put to stream as ('kill', x, player index) for every kill in it
+        and ('points', array of new points), then ('end', ShotResult) is put in the end, even if resolving fails.
+        Returns None without finishing, if cancelled is set.
+
+        Results are cached for the same formula, shooter and map version, then they are put to stream at once"""
+
+        shooter = self.active_player
+        key = (formula.canonical(), shooter.x, shooter.y, self.map_version, self.trajectory_tolerance)
+        with self._shot_cache_lock:
+            result = self._shot_cache.get(key)
+            if result is not None:
+                self._shot_cache.move_to_end(key)
+                self._shot_cache_hits += 1
+            else:
+                self._shot_cache_misses += 1
+
+        if result is not None:
+            if stream is not None:
+                for kill in result.kills:
+                    stream.put(('kill',) + kill)
+                stream.put(('points', result.points[1:]))
+        else:
+            try:
+                result = self._resolve_shot(formula, stream, cancelled)
+            except Exception as e:  # in a worker thread nobody else catches it, so the shot must be ended here
+                print(e)
+                start = np.array([(shooter.x, shooter.y)], dtype=float)
+                result = ShotResult(start, -1 if shooter in self.right_team else 1, 'error')
+                if stream is not None:
+                    stream.put(('end', result))
+                return result  # not cached, the error may be not caused by the formula
+            if result is None:
+                return None
+            with self._shot_cache_lock:
+                self._shot_cache[key] = result
+                if len(self._shot_cache) > self.shot_cache_size:
+                    self._shot_cache.popitem(last=False)
+
+        if stream is not None:
+            stream.put(('end', result))
+        return result
+
+    def shot_cache_info(self) -> tuple:
+        """returns hits, misses, maxsize and currsize of the cache of shot results, like Formula.cache_info"""
+        with self._shot_cache_lock:
+            return self._shot_cache_hits, self._shot_cache_misses, self.shot_cache_size, len(self._shot_cache)
+
+    def _resolve_shot(self, formula: Formula, stream: Queue = None, cancelled: Event = None) -> ShotResult:
+        """does the work of simulate_shot without cache and without putting the end to stream"""
+
+        shooter = self.active_player
+        direction = -1 if shooter in self.right_team else 1
+        start = np.array([(shooter.x, shooter.y)], dtype=float)
+        try:
+            y_delta = shooter.y - formula.evaluate(shooter.x)
+        except EvaluatingError:  # formula isn't defined where the shooter is
+            return ShotResult(start, direction, 'undefined')
+        except Exception:
+            return ShotResult(start, direction, 'error')
+        empty_chunks = self.get_empty_chunks(formula, y_delta)
+
+        active_team = self.left_team if shooter in self.left_team else self.right_team
+        targets = [index for index, player in enumerate(self.all_players)
+                   if player != shooter and player.alive and (self.friendly_fire or player not in active_team)]
+        centers = np.array([(self.all_players[index].x, self.all_players[index].y) for index in targets]).reshape(-1, 2)
+        radii = np.array([self.all_players[index].hitbox_radius for index in targets])
+        not_killed = np.ones(len(targets), dtype=bool)
+
+        all_points, kills = [start], []
+        stop_reason, obstacle_index = None, None
+        piece_width = self._shot_piece_width * self.game_field_ratio
+        while stop_reason is None:
+            if cancelled is not None and cancelled.is_set():
+                return None
+            x_from = all_points[-1][-1, 0]
+            x_to = (math.floor(x_from * direction / piece_width) + 1) * piece_width * direction  # fixed piece ends
+            if x_to * direction >= self.x_edge:
+                x_to, stop_reason = direction * self.x_edge, 'edge'
+            try:
+                xs, ys, defined = sample_range(formula, x_from, x_to, self.trajectory_tolerance,
+                                               (-self.y_edge - y_delta, self.y_edge - y_delta))
+            except Exception:
+                stop_reason = 'error'
+                break
+            ys = ys + y_delta
+
+            # cutting the piece where the formula becomes undefined or the graph crosses the border
+            end = len(xs)
+            undefined = np.flatnonzero(~defined)
+            if len(undefined):
+                end, stop_reason = undefined[0], 'undefined'
+            outside = np.flatnonzero(np.abs(ys[:end]) >= self.y_edge)
+            if len(outside):
+                end, stop_reason = outside[0] + 1, 'border'
+            points = np.column_stack((xs[:end], ys[:end]))  # starts from the last point of previous piece
+            if len(points) < 2:
+                break
+            segments = polyline_segments(points)
+            offsets = np.concatenate(([0], np.cumsum(shapely.length(segments))[:-1]))
+
+            # finding the first obstacle on the way, segments inside empty chunks can't touch anything
+            maybe_touching = ~self.in_empty_chunks(empty_chunks, np.minimum(points[:-1, 0], points[1:, 0]),
+                                                   np.maximum(points[:-1, 0], points[1:, 0]))
+            hit_distance, obstacle_index, hit_point = self.obstacle_index.first_hit(segments[maybe_touching],
+                                                                                   offsets[maybe_touching])
+
+            # finding players touched before the obstacle, all at once
+            distances, entry_points = circles_entry(points, centers, radii)
+            touched = np.flatnonzero(not_killed & (distances < hit_distance))
+
+            # moving all contacts from the sampled polyline onto the graph, the obstacle goes first
+            obstacle_hit = obstacle_index is not None
+            if obstacle_hit:
+                entry_points = np.concatenate(([hit_point], entry_points[touched]))
+            else:
+                entry_points = entry_points[touched]
+
+            def contains(xs, ys):
+                inside = (xs[obstacle_hit:] - centers[touched, 0]) ** 2 + \
+                         (ys[obstacle_hit:] - centers[touched, 1]) ** 2 <= radii[touched] ** 2
+                if obstacle_hit:
+                    inside = np.concatenate((shapely.intersects_xy(self.obstacles[obstacle_index], xs[:1], ys[:1]),
+                                             inside))
+                return inside
+
+            contacts = refine_contacts(formula, y_delta, points, direction, entry_points, contains)
+            if obstacle_hit:
+                hit_point, contacts = contacts[0], contacts[1:]
+                stop_reason = 'obstacle'
+                points = np.concatenate((points[points[:, 0] * direction < hit_point[0] * direction], [hit_point]))
+            for contact in np.argsort(contacts[:, 0] * direction, kind='stable'):
+                if obstacle_hit and contacts[contact, 0] * direction >= hit_point[0] * direction:
+                    continue
+                not_killed[touched[contact]] = False
+                kills.append((float(contacts[contact, 0]), targets[touched[contact]]))
+                if stream is not None:
+                    stream.put(('kill',) + kills[-1])
+
+            all_points.append(points[1:])
+            if stream is not None:
+                stream.put(('points', points[1:]))
+
+        return ShotResult(np.concatenate(all_points), direction, stop_reason, obstacle_index, kills)
+
     def is_game_end(self) -> bool:
         end = True
         for player in self.right_team:
@@ -211,13 +370,21 @@ class Game:
 class GameView(View):
     background = load_texture('textures/GameBackground_4k.jpg')
     panel_texture = load_texture('textures/bottom_panel_4k.jpg')
+    _shot_draw_piece = 64  # maximum number of trajectory points drawn as one line strip
 
     def __init__(self, window: Window):
         super().__init__(window)
-        self.translation_y_delta = None
-        self.obstacle_border_batch_shapes = None
-        self.obstacles_batch: pyglet.graphics.Batch() = None
-        self.obstacle_body_batch_shapes = None
+        # the current shot, streamed from the worker thread
+        self.shot_stream: Queue = None
+        self.shot_cancelled: Event = None  # set to stop the worker
+        self.shot_worker: Thread = None
+        self.shot_direction = 1
+        self.shot_points = None  # resolved points of the shot
+        self.shot_kills = []  # resolved kills of the shot as (x, player index)
+        self.shot_points_shown = 0  # number of points of the current shot already drawn
+        self.shot_kills_shown = 0  # number of kills of the current shot already done
+        self.budget_hit_frames = 0  # number of frames, where the shot couldn't be drawn within the frame budget
+        self.obstacle_renderer: ObstacleRenderer = None  # draws game.obstacles, changed together with them
         self.formula_field: AdvancedUIInputText = None
         self.time_text: Text = None
         self.game_field_objects = shape_list.ShapeElementList()  # contains all static shape elements of the interface
@@ -269,8 +436,7 @@ class GameView(View):
             from events import ActivePlayerChangeEvent
             self.game_event_manager.add_local_event(ActivePlayerChangeEvent(active_player))
 
-        # generating obstacles
-        self.game.create_obstacles()
+        # drawing obstacles of the map loaded by game.prepare
         self.create_obstacles_batch()
 
         # adding thread to timer func
@@ -388,6 +554,7 @@ class GameView(View):
 
     def skip_vote(self):
         if not self.game.multiplayer:  # immediately change map if game it's solo game
+            self.cancel_shot()
             if self.timer:
                 self.timer.cancel()
             start_new_game(self.window.lobby, self.window)
@@ -405,6 +572,7 @@ class GameView(View):
         @message_box.event("on_action")
         def on_action(event: gui.UIOnActionEvent):
             if event.action == 'Yes':
+                self.cancel_shot()
                 if self.timer:
                     self.timer.cancel()
                 from lobby import LobbyView
@@ -421,8 +589,11 @@ class GameView(View):
             return
         try:
             formula = Formula(user_formula)
-        except TranslateError:
-            self.send_message('Something went wrong during translation,\nformula is not correct!')
+        except TranslateError as error:
+            message = 'Something went wrong during translation,\nformula is not correct!'
+            if error.column is not None:  # pointing at the wrong symbol
+                message += f'\nsee symbol {error.column + 1}: "{user_formula[error.column]}"'
+            self.send_message(message)
             return
         from events import StartFireEvent
         self.game_event_manager.add_local_event(StartFireEvent(formula))
@@ -446,6 +617,7 @@ class GameView(View):
             return None  # cannot kill dead player
         player.set_dead_texture()
         player.alive = False
+        game.map_version += 1
 
     def game_finish(self):
         self.timer.cancel()
@@ -462,13 +634,13 @@ class GameView(View):
         clipper is the polygon of "blow", it's a bit randomized and has given size as radius"""
 
         game = self.game
+        game.map_version += 1
         blow_radius = 1.35 * game.game_field_ratio
         obstacle = game.obstacles[obstacle_index]  # shapely Polygon object
 
-        # deleting previous obstacle shapes from batch
-        self.obstacle_body_batch_shapes.pop(obstacle_index)
-        self.obstacle_border_batch_shapes.pop(obstacle_index)
-        game.obstacles.pop(obstacle_index)  # deleting old obstacle game object
+        # deleting previous obstacle shapes from the vertex buffer
+        self.obstacle_renderer.pop(obstacle_index)
+        game.obstacle_index.pop(obstacle_index)  # deleting old obstacle game object
 
         # generating clipping polygon
         angle_angle_sum = 0
@@ -504,8 +676,8 @@ class GameView(View):
                 difference = []
                 print("unknown difference type: ", _)
         for polygon in difference:
-            game.obstacles.append(polygon)  # adding new obstacle
-            self.add_batch_obstacle(polygon)  # creating new shapes
+            game.obstacle_index.append(polygon)  # adding new obstacle
+            self.obstacle_renderer.append(polygon)  # creating new shapes
 
     def on_update(self, delta_time=1. / 60):
         window = self.window
@@ -518,91 +690,103 @@ class GameView(View):
             print(e)
 
         if game.shooting:
-            """when the game shooting event is active, a part of the formula is drawn each frame.
-            This process is local to performance needs and to alleviate server's load,
-            so may vary a bit if players have  different screen resolutions.
+            """when the game shooting event is active, a part of the shot trajectory is drawn each frame.
+            The shot is resolved in a worker thread (see Game.simulate_shot and start_shot), here it's only shown:
+            the drawn part grows with constant speed (game.shot_speed), but never ahead of already resolved points,
+            players are killed when it reaches them and the obstacle is hit in the end.
             
-            Then, if the game is multiplayer, a server will send its version of the  result of the shoot like who 
-            was killed, which obstacles have been damaged and so on"""
-
-            shooter_right: bool = game.active_player in game.right_team
-            segments_per_frame = int(12 * self.window.scale)
-            x_step_px = 0.5 * window.scale
-            x_step = x_step_px / self.px_per_unit * (
-                -1 if shooter_right else 1)  # step in axis units ( regards the sign )
-            point_list = []
+            The result is in game units only, so it's the same for all players whatever screen resolution
+            they have, and a server can check it or send its own version to clients"""
+
+            # the shot moves with constant speed in game units, whatever the frame rate is
+            deadline = time.perf_counter() + game.shot_frame_budget
+            self.receive_shot(deadline)
+            direction = self.shot_direction
+            x_step = game.shot_speed * game.game_field_ratio * delta_time * direction
+            game.formula_current_x = min((game.formula_current_x + x_step) * direction,
+                                         self.shot_points[-1, 0] * direction) * direction
+
+            # drawing new part of the trajectory by small pieces, starting from the last drawn point.
+            # When the frame budget runs out, the rest is drawn in the next frames
+            reached = int(np.searchsorted(self.shot_points[:, 0] * direction, game.formula_current_x * direction,
+                                          side='right'))
+            while self.shot_points_shown < reached:
+                if time.perf_counter() > deadline:
+                    self.budget_hit_frames += 1
+                    break
+                first = max(self.shot_points_shown - 1, 0)
+                self.shot_points_shown = min(reached, first + self._shot_draw_piece)
+                if self.shot_points_shown - first >= 2:
+                    screen_points = self.shot_points[first:self.shot_points_shown] * self.px_per_unit + (
+                        self.graph_x_center, self.graph_y_center)
+                    game.formula_segments.append(shape_list.create_line_strip(point_list=screen_points.tolist(),
+                                                                              color=color.RED,
+                                                                              line_width=1 * window.scale))
+
+            # killing players, who are already reached by the drawn part
+            drawn_x = self.shot_points[max(self.shot_points_shown - 1, 0), 0]
+            while self.shot_kills_shown < len(self.shot_kills):
+                kill_x, player_index = self.shot_kills[self.shot_kills_shown]
+                if kill_x * direction > drawn_x * direction:
+                    break
+                self.kill_player(game.all_players[player_index])
+                self.shot_kills_shown += 1
+
+            shot = game.shot
+            if shot is not None and self.shot_points_shown >= len(self.shot_points):
+                match shot.stop_reason:
+                    case 'obstacle':
+                        self.obstacle_hit(shot.obstacle_index, Point(shot.points[-1]))
+                    case 'undefined':
+                        print('Formula is undefined here! Shoot stopped!')
+                    case 'error':
+                        print('some error occurred! Shoot stopped!')
+                self.stop_shooting()
 
+    def start_shot(self, formula: Formula):
+        """starts resolving the shot of the active player in a worker thread, which streams it to on_update"""
+        game = self.game
+        self.cancel_shot()
+        self.shot_stream = Queue()
+        self.shot_cancelled = Event()
+        self.shot_direction = -1 if game.active_player in game.right_team else 1
+        self.shot_points = np.array([(game.active_player.x, game.active_player.y)], dtype=float)
+        self.shot_kills = []
+        self.shot_points_shown = 0
+        self.shot_kills_shown = 0
+        game.shot = None
+        self.shot_worker = Thread(target=game.simulate_shot, args=(formula, self.shot_stream, self.shot_cancelled))
+        self.shot_worker.daemon = True
+        self.shot_worker.start()
+
+    def receive_shot(self, deadline: float = math.inf):
+        """takes everything, that the shot worker has already resolved, without waiting,
+        but not after deadline (time.perf_counter value), then the rest is left for the next frames"""
+        new_points = []
+        while time.perf_counter() <= deadline:
             try:
-                # evaluating the coordinates of segment points
-                for _ in range(segments_per_frame + 1):
-                    point_y = game.formula.evaluate(game.formula_current_x) + self.translation_y_delta
-                    point_list.append((game.formula_current_x, point_y))
-                    game.formula_current_x += x_step
-                segment = LineString(point_list)
-                game.formula_current_x -= x_step  # decreasing the value, as it was increased 1 more time at the end of segment
-
-                # translating and adding this segment to the screen to be drawn
-                screen_points = [
-                    (self.graph_x_center + self.px_per_unit * x, self.graph_y_center + self.px_per_unit * y) for x, y in
-                    point_list]
-                game.formula_segments.append(shape_list.create_line_strip(point_list=screen_points, color=color.RED,
-                                                                          line_width=1 * window.scale))
-
-                # checking for collision with obstacles
-                for obstacle_index, obstacle in enumerate(game.obstacles):
-                    intersections = segment.intersection(obstacle)
-                    if intersections:
-                        first_collision_point = None
-                        match intersections.geom_type:
-                            case 'LineString':
-                                first_collision_point = Point(
-                                    intersections.coords[-1] if shooter_right else intersections.coords[0])
-                            case 'MultiLineString':
-                                for line in intersections.geoms:
-                                    if not first_collision_point:
-                                        first_collision_point = Point(
-                                            line.coords[-1] if shooter_right else line.coords[0])
-                                    elif shooter_right and line.coords[-1][0] > first_collision_point.x:
-                                        first_collision_point = Point(line.coords[-1])
-                                    elif not shooter_right and line.coords[0][0] < first_collision_point.x:
-                                        first_collision_point = Point(line.coords[0])
-                            case 'Point':
-                                first_collision_point = intersections
-                            case _:
-                                print('\n\nunknown geometry: ', _)
-                        self.obstacle_hit(obstacle_index, first_collision_point)
-                        self.stop_shooting()
-                        return
-
-                # checking for collision with players
-                active_team = game.left_team if game.active_player in game.left_team else game.right_team
-                for player in game.all_players:
-                    if player == game.active_player:
-                        continue
-                    if player in active_team and not game.friendly_fire:
-                        continue
-                    if segment.intersects(player.hitbox):
-                        self.kill_player(player)
-                        continue
-
-                # checking for crossing over vertical borders
-                if abs(point_list[-1][1]) >= game.y_edge:
-                    self.stop_shooting()
-                    return
-
-                # checking for crossing over horizontal borders
-                if abs(game.formula_current_x) >= game.x_edge:
-                    self.stop_shooting()
-                    return
-
-            except Exception as exception:
-                self.stop_shooting()
-                if exception == ZeroDivisionError:
-                    print('Zero dividing found! Shoot stopped!')
-                elif exception == ArgumentOutOfRange:
-                    print('Argument error! Shoot stopped!')
-                else:
-                    print('some error occurred!', exception)
+                item = self.shot_stream.get_nowait()
+            except Empty:
+                break
+            match item[0]:
+                case 'points':
+                    new_points.append(item[1])
+                case 'kill':
+                    self.shot_kills.append(item[1:])
+                case 'end':
+                    self.game.shot = item[1]
+        if new_points:
+            self.shot_points = np.concatenate([self.shot_points] + new_points)
+
+    def cancel_shot(self):
+        """Stops the shot worker, if it's still running, and waits for it.
+
+        The worker checks the flag between pieces of the trajectory, so it takes a few milliseconds at most,
+        and after that the game (obstacles, players) can be changed, without the worker reading it"""
+        if self.shot_cancelled is not None:
+            self.shot_cancelled.set()
+        if self.shot_worker is not None:
+            self.shot_worker.join()
 
     def stop_shooting(self):
         game = self.game
@@ -611,6 +795,7 @@ class GameView(View):
         game.shooting = False
         game.formula = None
         game.formula_current_x = None
+        game.shot = None
         game.formula_segments = None
         if not game.multiplayer:
             from events import GameEndEvent, ActivePlayerChangeEvent
@@ -644,43 +829,17 @@ class GameView(View):
         arcade.finish_render()
 
     def create_obstacles_batch(self):
-        """translates from axes units to pixels and creates local batch of obstacle shapes"""
-        self.obstacles_batch = pyglet.graphics.Batch()  # creating new batch
-        self.obstacle_body_batch_shapes = []
-        self.obstacle_border_batch_shapes = []
+        """translates from axes units to pixels and creates local vertex buffer of obstacle shapes"""
+        if self.obstacle_renderer:
+            self.obstacle_renderer.clear()
+        self.obstacle_renderer = ObstacleRenderer(self.px_per_unit, (self.graph_x_center, self.graph_y_center),
+                                                  int(2 * self.window.scale), self.game.obstacles_color,
+                                                  self.game.obstacles_border_color)
         for polygon in self.game.obstacles:
-            self.add_batch_obstacle(polygon)
-
-    def add_batch_obstacle(self, polygon):
-        """Takes a shapely polygon on input in game units,
-         translates to the pixels and adds it to the local obstacle batch. Also creates border for it"""
-
-        obstacle = []
-        border = []
-
-        # translating into pixel units and moving to appropriate position
-        polygon = [(x * self.px_per_unit + self.graph_x_center, y * self.px_per_unit + self.graph_y_center)
-                   for x, y in polygon.exterior.coords]
-
-        # creating obstacle body from triangles
-        triangles = tripy.earclip(polygon)
-        for tr in triangles:
-            obstacle.append(pyglet.shapes.Triangle(tr[0][0], tr[0][1], tr[1][0], tr[1][1], tr[2][0], tr[2][1],
-                                                   self.game.obstacles_color, batch=self.obstacles_batch))
-        self.obstacle_body_batch_shapes.append(obstacle)
-
-        # creating obstacle border
-        last_point = polygon[-1]
-        for point in polygon:
-            border.append(pyglet.shapes.Line(last_point[0], last_point[1], point[0], point[1],
-                                             width=int(2 * self.window.scale),
-                                             color=self.game.obstacles_border_color, batch=self.obstacles_batch))
-            last_point = point
-        self.obstacle_border_batch_shapes.append(border)
+            self.obstacle_renderer.append(polygon)
 
     def obstacles_draw(self):
-        batch = self.obstacles_batch
-        batch.draw()
+        self.obstacle_renderer.draw()
 
     def players_draw(self):
         game = self.game
@@ -0,0 +1,184 @@
+"""
+Copyright© 2024 Artur Pozniak <noi.kucia@gmail.com> or <noiszewczyk@gmail.com>.
+All rights reserved.
+This program is released under license GPL-3.0-or-later
+
+This file is part of MathGraph.
+MathGraph is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+MathGraph is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with MathGraph.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import random
+import struct
+from collections import deque
+from threading import Thread, Condition
+
+import numpy as np
+import shapely
+
+from obstacles import generate_obstacles
+
+spawn_attempts = 100  # maximum number of random positions tried for one player, then free places are searched
+
+# binary map file: magic, format version, seed and settings, then spawns as float64 (x, y) pairs,
+# obstacles count, WKB size of every obstacle as uint32 and WKB of all obstacles one after another
+map_magic = b'MGMAP'
+map_format_version = 1
+map_header = struct.Struct('<5sBQdddIdII')
+
+
+class GameMap:
+    """Obstacles and player spawn points of one round, generated from the seed for the settings tuple
+    (x_edge, y_edge, game_field_ratio, average obstacles count, player_size, left team size, right team size),
+    the same seed and settings always give the same map.
+
+    spawns is array of (x, y) of the left team players followed by the right team ones"""
+    __slots__ = ('seed', 'settings', 'obstacles', 'spawns')
+
+    def __init__(self, seed: int, settings: tuple, obstacles: list, spawns: np.ndarray):
+        self.seed = seed
+        self.settings = settings
+        self.obstacles = obstacles
+        self.spawns = spawns
+
+    def to_bytes(self) -> bytes:
+        """packs the map into the binary map format"""
+        obstacles = shapely.to_wkb(np.array(self.obstacles, dtype=object).reshape(-1))
+        sizes = np.array([len(obstacle) for obstacle in obstacles], dtype='<u4')
+        return b''.join((map_header.pack(map_magic, map_format_version, self.seed, *self.settings),
+                         np.ascontiguousarray(self.spawns, dtype='<f8').tobytes(),
+                         struct.pack('<I', len(obstacles)), sizes.tobytes(), *obstacles))
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """unpacks the map from the binary map format, raises ValueError if data isn't a correct map"""
+        if data[:len(map_magic)] != map_magic or len(data) < map_header.size + 4:
+            raise ValueError('not a map file')
+        _, version, seed, *settings = map_header.unpack_from(data)
+        if version != map_format_version:
+            raise ValueError(f'unsupported map format version {version}')
+        players = settings[5] + settings[6]
+        position = map_header.size + players * 16
+        if len(data) < position + 4:
+            raise ValueError('map file is damaged')
+        count, = struct.unpack_from('<I', data, position)
+        spawns = np.frombuffer(data, '<f8', players * 2, map_header.size).reshape(players, 2).copy()
+        sizes = np.frombuffer(data, '<u4', count, position + 4)  # raises ValueError itself, if data is too short
+        ends = position + 4 + sizes.nbytes + np.cumsum(sizes, dtype=np.int64)
+        if (ends[-1] if count else position + 4) != len(data):
+            raise ValueError('map file is damaged')
+        starts = ends - sizes
+        try:
+            obstacles = shapely.from_wkb([data[start:end] for start, end in zip(starts, ends)])
+        except shapely.errors.GEOSException:
+            raise ValueError('map file is damaged') from None
+        return cls(seed, tuple(settings), list(obstacles), spawns)
+
+
+def write_map(game_map: GameMap, path: str):
+    with open(path, 'wb') as file:
+        file.write(game_map.to_bytes())
+
+
+def read_map(path: str) -> GameMap:
+    with open(path, 'rb') as file:
+        return GameMap.from_bytes(file.read())
+
+
+def generate_spawns(settings: tuple, rng: np.random.Generator) -> np.ndarray:
+    """generates player positions on their sides of the game field, so their boxes don't overlap,
+    raises ValueError if there is no room for all players"""
+    x_edge, y_edge, _, _, player_size, left_count, right_count = settings
+    spawns = np.empty((left_count + right_count, 2))
+
+    def overlapping(x, y, placed):
+        return np.any((np.abs(placed[:, 0] - np.reshape(x, (-1, 1))) < player_size) &
+                      (np.abs(placed[:, 1] - np.reshape(y, (-1, 1))) < player_size), axis=1)
+
+    for i in range(len(spawns)):
+        shift = -x_edge if i < left_count else 0  # players from the left team are just shifted to the left side
+        for _ in range(spawn_attempts):
+            x = rng.uniform(player_size, x_edge - player_size) + shift
+            y = rng.uniform(-y_edge + player_size, y_edge - player_size)
+            if not overlapping(x, y, spawns[:i])[0]:
+                break
+        else:
+            # the side is crowded, so a random one of free places on a fine grid is taken
+            grid_x, grid_y = np.meshgrid(np.arange(player_size, x_edge - player_size, player_size / 4) + shift,
+                                         np.arange(-y_edge + player_size, y_edge - player_size, player_size / 4))
+            free = np.flatnonzero(~overlapping(grid_x.ravel(), grid_y.ravel(), spawns[:i]))
+            if not len(free):
+                raise ValueError('there is no room for all players on the game field')
+            place = rng.choice(free)
+            x, y = grid_x.ravel()[place], grid_y.ravel()[place]
+        spawns[i] = x, y
+    return spawns
+
+
+def generate_map(settings: tuple, seed: int = None) -> GameMap:
+    """generates map in axes units coordinates, so it's independent of screen resolution and before drawing
+    must be scaled. It's common to all players and provides reference data to calculate collision.
+
+    The map is reproduced by the same seed and settings, random seed is chosen if it's not given"""
+    if seed is None:
+        seed = random.getrandbits(64)
+    rng = np.random.default_rng(seed)
+    x_edge, y_edge, field_ratio, obstacles_count, player_size, _, _ = settings
+    spawns = generate_spawns(settings, rng)
+    player_boxes = shapely.box(spawns[:, 0] - player_size / 2, spawns[:, 1] - player_size / 2,
+                               spawns[:, 0] + player_size / 2, spawns[:, 1] + player_size / 2)
+    count = int(obstacles_count * (1 + rng.uniform(-0.15, 0.15)))  # creating +-15% from obstacles_count
+    return GameMap(seed, settings, generate_obstacles(count, x_edge, y_edge, field_ratio, player_boxes, rng), spawns)
+
+
+class MapPool:
+    """Keeps up to size ready maps for the last requested settings, generated in background thread,
+    so the next round doesn't wait for the map generation.
+
+    Maps for other settings are dropped, when settings change"""
+
+    def __init__(self, size: int = 3):
+        self.size = size
+        self._settings = None
+        self._maps = deque()
+        self._condition = Condition()  # guards settings and maps, notifies the producer, when a map is taken
+        self._thread: Thread = None
+
+    def take(self, settings: tuple) -> GameMap:
+        """returns ready map for settings or generates it right now, if there is no such"""
+        with self._condition:
+            if settings != self._settings:
+                self._settings = settings
+                self._maps.clear()
+            game_map = self._maps.popleft() if self._maps else None
+            self._condition.notify()
+            if self._thread is None:
+                self._thread = Thread(target=self._produce, daemon=True)
+                self._thread.start()
+        return game_map or generate_map(settings)
+
+    def ready(self) -> int:
+        """number of maps waiting in the pool"""
+        with self._condition:
+            return len(self._maps)
+
+    def _produce(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self._maps) < self.size)
+                settings = self._settings
+            game_map = generate_map(settings)
+            with self._condition:
+                if settings == self._settings and len(self._maps) < self.size:
+                    self._maps.append(game_map)
+
+
+# the pool shared by all games, so a new Game for every match doesn't start one more producer thread
+map_pool = MapPool()
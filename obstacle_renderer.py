@@ -0,0 +1,120 @@
+"""
+Copyright© 2024 Artur Pozniak <noi.kucia@gmail.com> or <noiszewczyk@gmail.com>.
+All rights reserved.
+This program is released under license GPL-3.0-or-later
+
+This file is part of MathGraph.
+MathGraph is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+MathGraph is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with MathGraph.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+import pyglet
+from pyglet.gl import GL_TRIANGLES, GL_BLEND, GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA, glEnable, glDisable, glBlendFunc
+from shapely import Polygon
+
+from obstacles import triangulate
+
+vertex_source = """#version 150 core
+    in vec2 position;
+    in vec4 colors;
+    out vec4 vertex_colors;
+
+    uniform WindowBlock
+    {
+        mat4 projection;
+        mat4 view;
+    } window;
+
+    void main()
+    {
+        gl_Position = window.projection * window.view * vec4(position, 0.0, 1.0);
+        vertex_colors = colors;
+    }
+"""
+
+fragment_source = """#version 150 core
+    in vec4 vertex_colors;
+    out vec4 final_color;
+
+    void main()
+    {
+        final_color = vertex_colors;
+    }
+"""
+
+
+class _ObstacleGroup(pyglet.graphics.ShaderGroup):
+    """binds the obstacle shader and enables alpha blending like pyglet shapes do"""
+
+    def set_state(self):
+        super().set_state()
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+    def unset_state(self):
+        glDisable(GL_BLEND)
+        super().unset_state()
+
+
+class ObstacleRenderer:
+    """Draws obstacles from one packed vertex buffer by one draw call.
+
+    Every obstacle is a single vertex list with triangles of its body followed by quads of its border,
+    all lists are parts of the same buffer of the batch. Popped obstacle frees its part of the buffer,
+    which is reused by the next appended ones, so only changed obstacles are written to the buffer
+    and its size doesn't grow with number of hits.
+
+    Obstacles have the same list positions as in game.obstacles, so it must be changed together with
+    game.obstacle_index"""
+
+    def __init__(self, px_per_unit: float, center: tuple, border_width: float, color: tuple, border_color: tuple):
+        self.px_per_unit = px_per_unit
+        self.center = np.array(center)  # pixel position of (0, 0) game point
+        self.border_width = border_width  # in pixels
+        self.color = tuple(color[:4])  # rgba, like pyglet shapes take it
+        self.border_color = tuple(border_color[:4])
+        self.batch = pyglet.graphics.Batch()
+        program = pyglet.gl.current_context.create_program((vertex_source, 'vertex'), (fragment_source, 'fragment'))
+        self._group = _ObstacleGroup(program)
+        self._vertex_lists = []
+
+    def append(self, polygon: Polygon):
+        """adds polygon in game units to the end"""
+        body = (triangulate(polygon) * self.px_per_unit + self.center).reshape(-1, 2)
+        border = np.concatenate([self._border(np.array(ring.coords) * self.px_per_unit + self.center)
+                                 for ring in [polygon.exterior, *polygon.interiors]])
+        colors = np.concatenate((np.tile(np.array(self.color, dtype=np.uint8), (len(body), 1)),
+                                 np.tile(np.array(self.border_color, dtype=np.uint8), (len(border), 1))))
+        positions = np.concatenate((body, border)).astype(np.float32)
+        self._vertex_lists.append(self._group.program.vertex_list(
+            len(positions), GL_TRIANGLES, batch=self.batch, group=self._group,
+            position=('f', positions.ravel().tolist()), colors=('Bn', colors.ravel().tolist())))
+
+    def pop(self, position: int):
+        self._vertex_lists.pop(position).delete()
+
+    def clear(self):
+        for vertex_list in self._vertex_lists:
+            vertex_list.delete()
+        self._vertex_lists.clear()
+
+    def draw(self):
+        self.batch.draw()
+
+    def _border(self, ring: np.ndarray) -> np.ndarray:
+        """returns vertices of 2 triangles for every edge of closed ring, which make a line of border_width"""
+        starts, ends = ring[:-1], ring[1:]
+        direction = ends - starts
+        length = np.hypot(direction[:, 0], direction[:, 1])[:, None]
+        normal = np.column_stack((-direction[:, 1], direction[:, 0])) / np.where(length > 0, length, 1)
+        normal *= self.border_width / 2
+        return np.stack((starts + normal, starts - normal, ends - normal,
+                         starts + normal, ends - normal, ends + normal), axis=1).reshape(-1, 2)
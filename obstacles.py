@@ -0,0 +1,187 @@
+"""
+Copyright© 2024 Artur Pozniak <noi.kucia@gmail.com> or <noiszewczyk@gmail.com>.
+All rights reserved.
+This program is released under license GPL-3.0-or-later
+
+This file is part of MathGraph.
+MathGraph is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+MathGraph is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with MathGraph.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import math
+
+import numpy as np
+import shapely
+from shapely import STRtree, Polygon
+
+obstacle_attempts = 30  # maximum number of random polygons tried for one obstacle
+obstacle_shrink = 0.95  # every failed attempt makes next polygons of the obstacle smaller by this factor
+obstacle_failures = 3  # generation stops after this many obstacles in a row didn't find a free place
+
+
+class ObstacleIndex:
+    """Spatial index of the obstacle list, which finds obstacles, that can be touched by a polyline.
+
+    shapely STRtree can't be changed after it's built, so polygons appended later are kept aside and checked
+    by their bounds, popped ones are just hidden. The tree is rebuilt, when there are too many such changes.
+    The list must be changed only through pop and append of the index, to keep them consistent"""
+
+    _min_rebuild_changes = 16
+
+    def __init__(self, obstacles: list):
+        self.obstacles = obstacles
+        self.rebuild()
+
+    def rebuild(self):
+        self._tree = STRtree(self.obstacles)
+        self._positions = np.arange(len(self.obstacles))  # list position of every tree item, -1 if it's popped
+        self._extra_positions = []  # list positions of polygons appended after the tree was built
+        self._extra_bounds = np.empty((0, 4))  # bounds of these polygons
+        self._changes = 0
+
+    def pop(self, position: int):
+        polygon = self.obstacles.pop(position)
+        self._positions[self._positions == position] = -1
+        self._positions[self._positions > position] -= 1
+        self._extra_bounds = self._extra_bounds[np.array(self._extra_positions, dtype=int) != position]
+        self._extra_positions = [extra - (extra > position) for extra in self._extra_positions if extra != position]
+        self._changed()
+        return polygon
+
+    def append(self, polygon):
+        self.obstacles.append(polygon)
+        self._extra_positions.append(len(self.obstacles) - 1)
+        self._extra_bounds = np.concatenate((self._extra_bounds, [polygon.bounds]))
+        self._changed()
+
+    def _changed(self):
+        self._changes += 1
+        if self._changes > max(self._min_rebuild_changes, len(self.obstacles) // 4):
+            self.rebuild()
+
+    def query(self, geometries: np.ndarray) -> np.ndarray:
+        """returns sorted list positions of obstacles, whose bounding box intersects the bounding box
+        of any of geometries"""
+        return np.unique(self._query_pairs(geometries)[1])
+
+    def intersects_any(self, geometry) -> bool:
+        """checks if geometry touches any obstacle, only obstacles with intersecting bounding box are tested"""
+        if (self._positions[self._tree.query(geometry, predicate='intersects')] >= 0).any():
+            return True
+        if not self._extra_positions:
+            return False
+        x_min, y_min, x_max, y_max = geometry.bounds
+        extra_bounds = self._extra_bounds
+        touching = np.nonzero((extra_bounds[:, 0] <= x_max) & (extra_bounds[:, 2] >= x_min) &
+                              (extra_bounds[:, 1] <= y_max) & (extra_bounds[:, 3] >= y_min))[0]
+        return any(geometry.intersects(self.obstacles[self._extra_positions[i]]) for i in touching)
+
+    def first_hit(self, segments: np.ndarray, offsets: np.ndarray) -> tuple:
+        """Finds the first obstacle touched by the polyline made of segments (see trajectory.polyline_segments),
+        where offsets are distances along the polyline to the start of each segment.
+        All segment-obstacle pairs are tested at once against prepared obstacles.
+
+        Returns the distance along the polyline to the first touching point, list position of the obstacle
+        and array of (x, y) of the point or (inf, None, None) if nothing is touched"""
+
+        segment_indices, positions = self._query_pairs(segments)
+        if not len(positions):
+            return math.inf, None, None
+        obstacles = np.empty(len(self.obstacles), dtype=object)
+        obstacles[:] = self.obstacles
+        candidates = obstacles[positions]
+        shapely.prepare(candidates)  # lazily, once for every polygon, replaced ones are never prepared again
+        touching = shapely.intersects(candidates, segments[segment_indices])
+        if not touching.any():
+            return math.inf, None, None
+
+        # the exact first point can be only on the first touching segment
+        first = segment_indices[touching].min()
+        positions = positions[touching & (segment_indices == first)]
+        intersections = shapely.intersection(segments[first], obstacles[positions])
+        coordinates, owners = shapely.get_coordinates(intersections, return_index=True)
+        distances = shapely.line_locate_point(segments[first], shapely.points(coordinates))
+        best = np.argmin(distances)
+        return float(offsets[first] + distances[best]), int(positions[owners[best]]), coordinates[best]
+
+    def _query_pairs(self, geometries: np.ndarray) -> tuple:
+        """returns arrays of geometry indices and list positions of obstacles with intersecting bounding boxes"""
+        geometry_indices, tree_indices = self._tree.query(geometries)
+        positions = self._positions[tree_indices]
+        geometry_indices, positions = geometry_indices[positions >= 0], positions[positions >= 0]
+        if self._extra_positions:
+            extra = np.array(self._extra_positions)
+            extra_bounds = self._extra_bounds
+            bounds = shapely.bounds(geometries)
+            touching = (extra_bounds[:, 0] <= bounds[:, 2, None]) & (extra_bounds[:, 2] >= bounds[:, 0, None]) & \
+                       (extra_bounds[:, 1] <= bounds[:, 3, None]) & (extra_bounds[:, 3] >= bounds[:, 1, None])
+            extra_geometry_indices, extra_indices = np.nonzero(touching)
+            geometry_indices = np.concatenate((geometry_indices, extra_geometry_indices))
+            positions = np.concatenate((positions, extra[extra_indices]))
+        return geometry_indices, positions
+
+
+def triangulate(polygon: Polygon) -> np.ndarray:
+    """Splits polygon (holes are supported) into triangles by constrained Delaunay triangulation of GEOS,
+    returns array of shape (triangles, 3, 2) with (x, y) of triangle vertices"""
+    triangles = shapely.get_parts(shapely.constrained_delaunay_triangles(polygon))
+    return shapely.get_coordinates(triangles).reshape(-1, 4, 2)[:, :3]  # the last vertex closes the ring
+
+
+def random_obstacle(x_edge: float, y_edge: float, field_ratio: float, shrink: float,
+                    rng: np.random.Generator) -> Polygon:
+    """generates random polygon inside the game field, its size is multiplied by shrink"""
+    vertices = rng.integers(3, 20, endpoint=True)  # quantity of vertices in current polygon
+    # polygons with more vertices normally will be bigger than other
+    max_radius = int(rng.uniform(1 * field_ratio, 8 * field_ratio + 0.25 * field_ratio * vertices)) * shrink
+
+    # generating angles as part of 2 Pi radians:
+    angles = np.cumsum(rng.integers(35, 100, vertices, endpoint=True))
+    angles = -2 * math.pi * angles / angles[-1]
+
+    scales = rng.uniform(0.25, 1, vertices)
+    last_scale = 0.75
+    for i in range(vertices):
+        scales[i] = last_scale = (scales[i] + last_scale / 2) * 2 / 3  # making polygon more convex by smoothing angles
+
+    center_x = rng.uniform(max_radius - x_edge, x_edge - max_radius)
+    center_y = rng.uniform(max_radius - y_edge, y_edge - max_radius)
+    scales *= max_radius
+    return shapely.polygons(np.column_stack((center_x + scales * np.cos(angles), center_y + scales * np.sin(angles))))
+
+
+def generate_obstacles(count: int, x_edge: float, y_edge: float, field_ratio: float, blocked: list = (),
+                       rng: np.random.Generator = None) -> list:
+    """Places up to count random obstacles, which don't touch each other and blocked geometries (player boxes).
+
+    Every candidate is checked only against obstacles with intersecting bounding box through ObstacleIndex,
+    so the generation doesn't slow down quadratically. Each obstacle has obstacle_attempts tries,
+    and its polygons get smaller after every failed one, so crowded field is filled with smaller obstacles.
+    If there is no place even for them, the obstacle is skipped and after obstacle_failures skipped obstacles
+    in a row the field is considered full, so less obstacles than count can be returned"""
+
+    if rng is None:
+        rng = np.random.default_rng()
+    obstacles = []
+    index = ObstacleIndex(obstacles)
+    blocked = STRtree(list(blocked))
+    failures = 0
+    while len(obstacles) < count and failures < obstacle_failures:
+        shrink = 1
+        for _ in range(obstacle_attempts):
+            polygon = random_obstacle(x_edge, y_edge, field_ratio, shrink, rng)
+            if not index.intersects_any(polygon) and not len(blocked.query(polygon, predicate='intersects')):
+                index.append(polygon)
+                failures = 0
+                break
+            shrink *= obstacle_shrink
+        else:
+            failures += 1
+    return obstacles
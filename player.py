@@ -16,11 +16,9 @@ If not, see <https://www.gnu.org/licenses/>.
 """
 
 import os
-import random
 import sys
 
 import arcade
-import shapely
 
 from client import Client
 
@@ -31,13 +29,13 @@ if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
 class Player:
     __texture_left, __texture_right = arcade.load_texture_pair('textures/player_sprite.png')
     __texture_left_dead, __texture_right_dead = arcade.load_texture_pair('textures/player_sprite_dead.png')
-    __standard_height = 1.5  # height of the player sprite in axes units for default map size (16 y)
+    standard_height = 1.5  # height of the player sprite in axes units for default map size (16 y)
 
     def __init__(self, computer_player: bool = True, client: Client = None, left_player=True, name: str = None):
         self.sprite = None
         self.nick = None
         self.alive = True
-        self.hitbox = None  # contains the hitbox shapely object, used to calculate collision
+        self.hitbox_radius = None  # hitbox is a circle around (x, y), used to calculate collision
         self.computer_player = computer_player
         self.left_player = left_player
         # keep player Client object with all information about user to display
@@ -58,34 +56,16 @@ class Player:
         self.sprite.texture = self.__texture_left if self.left_player else self.__texture_right
 
     def create_sprite(self, view):
-        """this method must be called after creation of the game to create the sprite and hitbox,
-        because their coordinates depends on game parameters.
-
-        Does not check for collision with obstacles, so must be called before obstacle creation"""
+        """this method must be called after the map is loaded by game.prepare to create the sprite,
+        because its position and size are taken from the map spawn point"""
 
         game = view.game
-        self.player_size = self.__standard_height * game.game_field_ratio
-
-        while True:
-            # generating position and sprite
-            self.x = random.uniform(self.player_size, game.x_edge - self.player_size)
-            self.y = random.uniform(-game.y_edge + self.player_size, game.y_edge - self.player_size)
-            if self.left_player:  # if player is from the left teem, just shifting him to the left side
-                self.x -= game.x_edge
-
-            self.sprite = arcade.Sprite(self.__texture_left if self.left_player else self.__texture_right,
-                                        center_x=self.x * view.px_per_unit + view.graph_x_center,
-                                        center_y=self.y * view.px_per_unit + view.graph_y_center,
-                                        scale=self.player_size * view.px_per_unit / self.__texture_left.height)
-            if (not game.players_sprites_list) or \
-                    (not arcade.check_for_collision_with_list(self.sprite, game.players_sprites_list)):
-                break  # repeat until sprite isn't overlapping any other sprite
-
+        self.sprite = arcade.Sprite(self.__texture_left if self.left_player else self.__texture_right,
+                                    center_x=self.x * view.px_per_unit + view.graph_x_center,
+                                    center_y=self.y * view.px_per_unit + view.graph_y_center,
+                                    scale=self.player_size * view.px_per_unit / self.__texture_left.height)
         game.players_sprites_list.append(self.sprite)
 
-        # creating hitbox
-        self.hitbox = shapely.Point(self.x, self.y).buffer(self.player_size / 2 * 0.9)  # circular polygon
-
         # adding nick text object only once here
         self.nick = arcade.Text(self.client.name, start_x=self.sprite.center_x, start_y=self.sprite.bottom,
                                 anchor_y='top', anchor_x='center', font_size=int(14 * view.window.scale),
@@ -0,0 +1,204 @@
+"""
+Copyright© 2024 Artur Pozniak <noi.kucia@gmail.com> or <noiszewczyk@gmail.com>.
+All rights reserved.
+This program is released under license GPL-3.0-or-later
+
+This file is part of MathGraph.
+MathGraph is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+MathGraph is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with MathGraph.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import math
+
+import numpy as np
+import shapely
+
+from formula import Formula, differentiate
+
+# distances between 2 neighbour points along x in game units
+max_step = 1  # the longest one, every step longer than min_step is taken only where it's proven to be precise enough
+min_step = 0.002  # steps aren't halved below it even if the graph is still not smooth (asymptotes, jumps)
+contact_bisection_steps = 48  # contact points are found with precision of 2^-48 of a trajectory segment
+
+
+class ShotResult:
+    """The whole shot, resolved at once when it starts, before it's shown.
+
+    points is an array of (x, y) trajectory points in game units, in order of the shot, ending where it stops.
+    obstacle_index is the index of the hit obstacle in game.obstacles (hit in the last point) or None.
+    kills is a list of (x, player index in game.all_players) in order, in which players are touched.
+    stop_reason is one of 'edge', 'border', 'obstacle', 'undefined' and 'error'"""
+
+    __slots__ = ('points', 'direction', 'obstacle_index', 'kills', 'stop_reason')
+
+    def __init__(self, points: np.ndarray, direction: int, stop_reason: str, obstacle_index: int = None,
+                 kills: list = ()):
+        self.points = points
+        self.direction = direction  # 1 if the shot goes right, -1 if left
+        self.stop_reason = stop_reason
+        self.obstacle_index = obstacle_index
+        self.kills = list(kills)
+
+
+def polyline_segments(points: np.ndarray) -> np.ndarray:
+    """returns array of LineStrings of every segment of the polyline through points (array of (x, y)) in order,
+    or array of a single Point, if there is only one point"""
+    if len(points) < 2:
+        return shapely.points(points)
+    return shapely.linestrings(np.stack((points[:-1], points[1:]), axis=1))
+
+
+def circles_entry(points: np.ndarray, centers: np.ndarray, radii: np.ndarray) -> tuple:
+    """Finds where the polyline through points (array of (x, y)) enters every circle for all circles at once.
+
+    Returns array of distances along the polyline to the entry points (inf if the circle isn't touched)
+    and array of (x, y) of these points (nan if isn't touched)"""
+
+    starts, vectors = points[:-1, None, :], (points[1:] - points[:-1])[:, None, :]  # segments x circles
+    from_centers = starts - centers[None, :, :]
+
+    # solving |from_center + t * vector| = radius for every segment and circle, t in [0, 1] is on the segment
+    a = np.sum(vectors * vectors, axis=2)
+    b = np.sum(from_centers * vectors, axis=2)
+    c = np.sum(from_centers * from_centers, axis=2) - radii[None, :] ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(c <= 0, 0, (-b - np.sqrt(b * b - a * c)) / a)  # 0 if segment starts inside the circle
+    touching = (t >= 0) & (t <= 1)  # nan (no solutions) is never touching
+
+    lengths = np.hypot(*(points[1:] - points[:-1]).T)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    distances = np.full(len(centers), np.inf)
+    entry_points = np.full((len(centers), 2), np.nan)
+    for circle in np.flatnonzero(touching.any(axis=0)):
+        segment = np.argmax(touching[:, circle])  # the first touching one
+        parameter = t[segment, circle]
+        distances[circle] = offsets[segment] + parameter * lengths[segment]
+        entry_points[circle] = points[segment] + parameter * vectors[segment, 0]
+    return distances, entry_points
+
+
+def refine_contacts(formula: Formula, y_delta: float, points: np.ndarray, direction: int, entry_points: np.ndarray,
+                    contains) -> np.ndarray:
+    """Moves points, where the polyline through sampled trajectory points enters shapes, to the points, where
+    the graph of formula lifted by y_delta enters them, so contacts don't depend on sampling density.
+
+    entry_points is array of (x, y) of polyline entry points, one for every shape, and contains(xs, ys) checks
+    for every shape at once, if its point is inside it or on its border. Contact on the graph is found by
+    bisection on x between the start of the entered segment (outside) and the first point of the graph found
+    inside the shape on that segment. If the polyline only grazes a shape, missed by the graph, the entry point
+    is kept. Returns array of (x, y) of contact points"""
+
+    if not len(entry_points):
+        return entry_points.copy()
+    entry_x = entry_points[:, 0]
+    segments = np.clip(np.searchsorted(points[:, 0] * direction, entry_x * direction, side='right') - 1,
+                       0, len(points) - 2)
+    outside_x = points[segments, 0]
+
+    # looking for points of the graph inside the shapes, starting from polyline entry points
+    inside_x = np.full(len(entry_x), np.nan)
+    for probe_x in (entry_x, (entry_x + points[segments + 1, 0]) / 2, points[segments + 1, 0]):
+        probe_y, defined = formula.evaluate_many(probe_x)
+        found = np.isnan(inside_x) & defined & contains(probe_x, probe_y + y_delta)
+        inside_x[found] = probe_x[found]
+    refined = ~np.isnan(inside_x)
+    inside_x[~refined] = entry_x[~refined]
+
+    for _ in range(contact_bisection_steps):
+        middle_x = (outside_x + inside_x) / 2
+        middle_y, defined = formula.evaluate_many(middle_x)
+        inside = defined & contains(middle_x, middle_y + y_delta)
+        inside_x = np.where(inside, middle_x, inside_x)
+        outside_x = np.where(inside, outside_x, middle_x)
+
+    contacts = entry_points.copy()
+    contacts[refined, 0] = inside_x[refined]
+    contacts[refined, 1] = formula.evaluate_many(inside_x[refined])[0] + y_delta
+    return contacts
+
+
+def sample_range(formula: Formula, x_from: float, x_to: float, tolerance: float,
+                 y_range: tuple = (-math.inf, math.inf)):
+    """Samples the graph of formula on [x_from, x_to] adaptively: takes big steps where the graph is smooth
+    and refines where it changes quickly, so the polyline through the points is not further than tolerance
+    (in game units, measured vertically) from the graph.
+
+    A step longer than min_step is taken only if the middle point is close to the polyline and interval
+    evaluation proves it for the whole step: values of formula there are within tolerance, or the chord is close
+    by the bounds of the derivative, or the graph is outside y_range, or the formula is undefined everywhere.
+    Shorter steps are accepted on the middle point only, so asymptotes and jumps don't need infinite refining.
+
+    Points depend only on formula and game units, not on screen resolution: the graph is split at fixed x,
+    multiples of max_step, and these parts are refined by halving.
+    Parts of the graph, where formula values are outside y_range, aren't refined, as they are never drawn.
+    Returns arrays of x, y and defined mask (see Formula.evaluate_many) in order from x_from to x_to.
+    Every evaluated point is returned, so len of arrays is the number of evaluations"""
+
+    # starting from the grid of fixed absolute x, so the same part of the graph is always sampled the same way
+    x_low, x_high = min(x_from, x_to), max(x_from, x_to)
+    grid = np.arange(math.floor(x_low / max_step) + 1, math.ceil(x_high / max_step)) * max_step
+    xs = np.concatenate(([x_low], grid, [x_high]))
+    if x_to < x_from:
+        xs = xs[::-1].copy()
+    intervals = len(xs) - 1
+    ys, defined = formula.evaluate_many(xs)
+
+    # intervals still to be checked, as arrays of their left and right ends
+    left = np.arange(intervals)
+    right = left + 1
+    all_xs, all_ys, all_defined = [xs], [ys], [defined]
+    derivative = None  # tree of the derivative of formula, built only when it's needed
+    while len(left):
+        middle_xs = (xs[left] + xs[right]) / 2
+        middle_ys, middle_defined = formula.evaluate_many(middle_xs)
+        all_xs.append(middle_xs)
+        all_ys.append(middle_ys)
+        all_defined.append(middle_defined)
+
+        with np.errstate(invalid='ignore'):
+            error = np.abs(middle_ys - (ys[left] + ys[right]) / 2)
+            outside = ((ys[left] > y_range[1]) & (middle_ys > y_range[1]) & (ys[right] > y_range[1])) | \
+                      ((ys[left] < y_range[0]) & (middle_ys < y_range[0]) & (ys[right] < y_range[0]))
+        all_same_defined = (defined[left] == middle_defined) & (middle_defined == defined[right])
+        smooth = all_same_defined & (~middle_defined | (error <= tolerance) | outside)
+        width = np.abs(xs[right] - xs[left])
+
+        # middle point can miss narrow peaks and fast oscillations, so wide intervals must be proven to be smooth
+        check = np.flatnonzero(smooth & (width > min_step))
+        x_lows, x_highs = xs[left[check]], xs[right[check]]
+        y_lows, y_highs, continuous = formula.evaluate_intervals(x_lows, x_highs)
+        with np.errstate(invalid='ignore'):
+            flat = continuous & (y_highs - y_lows <= tolerance)
+            hidden = (y_highs < y_range[0]) | (y_lows > y_range[1])
+        proven = np.where(middle_defined[check], flat | hidden, np.isnan(y_lows))  # or undefined everywhere
+        by_derivative = np.flatnonzero(~proven & continuous)
+        if len(by_derivative):
+            # the graph is between lines through the ends of the interval with the slopes of derivative bounds,
+            # so it's not further than width * (highest slope - lowest slope) / 4 from the chord
+            if derivative is None:
+                derivative = differentiate(formula.tree)
+            slopes_low, slopes_high, slopes_exact = Formula.tree_intervals(derivative, x_lows[by_derivative],
+                                                                           x_highs[by_derivative])
+            proven[by_derivative] = slopes_exact & \
+                (width[check[by_derivative]] * (slopes_high - slopes_low) / 4 <= tolerance)
+        smooth[check] = proven
+        split = ~smooth & (width > min_step)
+
+        # adding middle points to the arrays to split intervals into 2 new ones
+        middle_indices = np.arange(len(xs), len(xs) + len(middle_xs))
+        xs = np.concatenate((xs, middle_xs))
+        ys = np.concatenate((ys, middle_ys))
+        defined = np.concatenate((defined, middle_defined))
+        left, right = np.concatenate((left[split], middle_indices[split])), \
+            np.concatenate((middle_indices[split], right[split]))
+
+    xs, ys, defined = np.concatenate(all_xs), np.concatenate(all_ys), np.concatenate(all_defined)
+    order = np.argsort(xs if x_to >= x_from else -xs, kind='stable')
+    return xs[order], ys[order], defined[order]